@@ -0,0 +1,1638 @@
+"""Spring S3O codec.
+
+Reader and writer of the Spring 3D object (.s3o) binary format, written in
+plain Python and NumPy, so it can be used either from the Blender add-ons or
+from any standalone tool, without a Blender process.
+
+A loaded model is a tree of pieces. Each piece keeps its vertices as a
+(N, 8) float32 array (xpos, ypos, zpos, xnormal, ynormal, znormal, texu, texv)
+in the s3o axes, and its vertex table as a flat uint32 array, exactly as they
+are stored in the file. Saving a model which has not been resized gives back
+the very same bytes that were loaded.
+"""
+import collections
+import contextlib
+import itertools
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+import numpy as np
+
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+bl_info = {
+    "name": "Spring S3O codec (shared library)",
+    "author": "Jez Kabanov and Jose Luis Cercos-Pita <jlcercos@gmail.com> and Breno 'MaDDoX' Azevedo <maddox.br@gmail.com>",
+    "version": (0, 1, 0),
+    "blender": (3, 6, 0),
+    "location": "",
+    "description": "Blender independent s3o reader/writer, required by the Spring S3O import and export add-ons",
+    "warning": "",
+    "wiki_url": "https://springrts.com/wiki/About_s3o",
+    "tracker_url": "http://springrts.com",
+    "support": "COMMUNITY",
+    "category": "Import-Export",
+}
+
+VERT_DTYPE = np.dtype("<f4")
+INDEX_DTYPE = np.dtype("<u4")
+# Index ending a triangle strip, so the next index starts a new one
+STRIP_RESTART = 0xFFFFFFFF
+
+
+def check_block(fdata, offset, size, where, what):
+    """Check that a block of a s3o file lies within the buffer.
+
+    Raises
+    ======
+
+    ValueError
+        If the block starts or ends beyond the end of the buffer
+    """
+    if offset + size > len(fdata) or (size == 0 and offset > len(fdata)):
+        raise ValueError(
+            "Corrupt s3o file, %s: %s at offset %d (%d bytes) beyond the end "
+            "of the file (%d bytes)" % (where, what, offset, size, len(fdata)))
+
+
+def read_string(fdata, offset):
+    end = fdata.find(b'\x00', offset)
+    if end == -1:
+        end = len(fdata)
+    return bytes(fdata[offset:end]).decode('ascii')
+
+
+def map_file(fhandle):
+    """Map a whole opened file in memory.
+
+    The returned buffer is read-only, and can be sliced and decoded in place
+    with struct.unpack_from and numpy.frombuffer, without any further seek or
+    read syscall.
+
+    Parameters
+    ==========
+
+    fhandle : file
+        File opened in binary mode
+
+    Returns
+    =======
+
+    data : mmap.mmap or bytes
+        The file contents. Empty files, which cannot be mapped, are returned
+        as an empty bytes object.
+    """
+    try:
+        return mmap.mmap(fhandle.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        return fhandle.read()
+
+
+def swap_axes(verts):
+    """Convert vertices between the s3o and the Blender axes.
+
+    The s3o Y and Z axes are swapped, and the X axis is mirrored, so this very
+    same function converts back and forth.
+
+    Parameters
+    ==========
+
+    verts : numpy.ndarray
+        (N, 8) array of vertices
+
+    Returns
+    =======
+
+    verts : numpy.ndarray
+        A new (N, 8) array with the converted vertices
+    """
+    verts = verts[:, [0, 2, 1, 3, 5, 4, 6, 7]]
+    verts[:, [0, 3]] *= -1
+    return verts
+
+
+class s3o_header(object):
+    binary_format = "<12sI5f4I"
+
+    magic = b'Spring unit'  # char [12] "Spring unit\0"
+    version = 0    # uint = 0
+    radius = 0.0 # float: radius of collision sphere
+    height = 0.0 # float: height of whole object
+    midx = 0.0 # float offset from origin
+    midy = 0.0 #
+    midz = 0.0 #
+    rootPieceOffset = 0 # offset of root piece
+    collisionDataOffset = 0 # offset of collision data, 0 = no data
+    texture1Offset = 0 # offset to filename of 1st texture
+    texture2Offset = 0 # offset to filename of 2nd texture
+    texture1 = ''
+    texture2 = ''
+
+    def load(self, fdata):
+        if len(fdata) < struct.calcsize(self.binary_format):
+            raise IOError("Not a Spring unit file: truncated header")
+        data = struct.unpack_from(self.binary_format, fdata, 0)
+        magic = data[0].decode('ascii', 'replace').replace('\x00', '').strip()
+        if(magic != 'Spring unit'):
+            raise IOError("Not a Spring unit file: '" + magic + "'")
+        self.magic = data[0]
+        self.version = data[1]
+        if(self.version != 0):
+            raise ValueError('Wrong file version: ' + str(self.version))
+        self.radius = data[2]
+        self.height = data[3]
+        self.midx = data[4]
+        self.midy = data[5]
+        self.midz = data[6]
+        self.rootPieceOffset = data[7]
+        self.collisionDataOffset = data[8]
+
+        check_block(fdata, self.rootPieceOffset, 1, "header", "root piece")
+
+        self.texture1Offset = data[9]
+        if(self.texture1Offset == 0):
+            self.texture1 = ''
+        else:
+            check_block(fdata, self.texture1Offset, 1, "header", "texture1")
+            self.texture1 = read_string(fdata, self.texture1Offset)
+
+        self.texture2Offset = data[10]
+        if(self.texture2Offset == 0):
+            self.texture2 = ''
+        else:
+            check_block(fdata, self.texture2Offset, 1, "header", "texture2")
+            self.texture2 = read_string(fdata, self.texture2Offset)
+        return
+
+    def pack(self):
+        return struct.pack(self.binary_format,
+                           self.magic,
+                           self.version,
+                           self.radius,
+                           self.height,
+                           self.midx,
+                           self.midy,
+                           self.midz,
+                           self.rootPieceOffset,
+                           self.collisionDataOffset,
+                           self.texture1Offset,
+                           self.texture2Offset)
+
+
+class s3o_piece(object):
+    binary_format = "<10I3f"
+
+    name = ''
+    parent = None
+
+    # File layout, as loaded. Pieces built from scratch have no offset
+    offset = None
+    nameOffset = 0 # uint
+    numChildren = 0 # uint
+    childrenOffset = 0 # uint
+    numVerts = 0 # uint
+    vertsOffset = 0 # uint
+    vertType = 0 # uint
+    primitiveType = 0 # 0 = tri, 1 = tristrips, 2 = quads
+    vertTableSize = 0 # number of indexes in vert table
+    vertTableOffset = 0
+    collisionDataOffset = 0
+    xoffset = 0.0
+    yoffset = 0.0
+    zoffset = 0.0
+
+    # Geometry prepared for the importer, see prepare_mesh()
+    mesh = None
+
+    def __init__(self):
+        self.verts = np.zeros((0, 8), dtype=VERT_DTYPE)
+        self.indices = np.zeros(0, dtype=INDEX_DTYPE)
+        self.children = []
+
+    def load(self, fdata, offset, geometry=True):
+        """Load the piece stored at offset, but not its children.
+
+        All the blocks referenced by the piece header are checked against the
+        buffer size before being read.
+
+        Parameters
+        ==========
+
+        fdata : buffer
+            s3o file contents
+        offset : int
+            Offset of the piece header
+        geometry : bool
+            False to skip the vertices and vertex table, keeping just their
+            sizes and offsets from the piece header
+
+        Returns
+        =======
+
+        childOffsets : tuple
+            Offsets of the children pieces
+        """
+        check_block(fdata, offset, struct.calcsize(self.binary_format),
+                    self.describe(offset), "header")
+        data = struct.unpack_from(self.binary_format, fdata, offset)
+
+        self.offset = offset
+        self.nameOffset = data[0]
+        self.numChildren = data[1]
+        self.childrenOffset = data[2]
+        self.numVerts = data[3]
+        self.vertsOffset = data[4]
+        self.vertType = data[5]
+        self.primitiveType = data[6]
+        self.vertTableSize = data[7]
+        self.vertTableOffset = data[8]
+        self.collisionDataOffset = data[9]
+        self.xoffset = data[10]
+        self.yoffset = data[11]
+        self.zoffset = data[12]
+
+        check_block(fdata, self.nameOffset, 1, self.describe(offset), "name")
+        self.name = read_string(fdata, self.nameOffset)
+        where = self.describe(offset)
+        check_block(fdata, self.vertsOffset, 4 * 8 * self.numVerts, where,
+                    "%d vertices" % self.numVerts)
+        check_block(fdata, self.vertTableOffset, 4 * self.vertTableSize,
+                    where, "%d vertex indexes" % self.vertTableSize)
+        check_block(fdata, self.childrenOffset, 4 * self.numChildren, where,
+                    "%d children offsets" % self.numChildren)
+
+        # Views of fdata, no copy is made
+        if(geometry and self.numVerts > 0):
+            self.verts = np.frombuffer(fdata, dtype=VERT_DTYPE,
+                                       count=8 * self.numVerts,
+                                       offset=self.vertsOffset).reshape(-1, 8)
+        if(geometry and self.vertTableSize > 0):
+            self.indices = np.frombuffer(fdata, dtype=INDEX_DTYPE,
+                                         count=self.vertTableSize,
+                                         offset=self.vertTableOffset)
+
+        self.children = []
+        # childrenOffset contains DWORDS containing offsets to child pieces
+        return struct.unpack_from("<%dI" % self.numChildren,
+                                  fdata, self.childrenOffset)
+
+    def describe(self, offset=None):
+        """Human readable piece location, for error messages"""
+        if offset is None:
+            offset = self.offset
+        where = "piece at offset %s" % offset
+        if self.name:
+            where = "piece '%s' at offset %s" % (self.name, offset)
+        if self.parent is not None:
+            where += " (child of '%s')" % self.parent.name
+        return where
+
+    def pack(self):
+        return struct.pack(self.binary_format,
+                           self.nameOffset,
+                           self.numChildren,
+                           self.childrenOffset,
+                           self.numVerts,
+                           self.vertsOffset,
+                           self.vertType,
+                           self.primitiveType,
+                           self.vertTableSize,
+                           self.vertTableOffset,
+                           self.collisionDataOffset,
+                           self.xoffset,
+                           self.yoffset,
+                           self.zoffset)
+
+    def faces(self):
+        """Vertex table as an array of primitives.
+
+        Returns
+        =======
+
+        faces : numpy.ndarray
+            (F, 3) array of triangles, or (F, 4) array of quads. Triangle
+            strips are expanded to triangles
+        """
+        if(self.primitiveType == 0): # triangles
+            width = 3
+        elif(self.primitiveType == 1): # tristrips
+            return strip_to_triangles(self.indices)
+        elif(self.primitiveType == 2): # quads
+            width = 4
+        else:
+            raise TypeError('Unknown primitive type: ' + str(self.primitiveType))
+        count = len(self.indices) - len(self.indices) % width
+        return self.indices[:count].reshape(-1, width)
+
+
+def strip_to_triangles(indices):
+    """Expand triangle strips into a list of triangles.
+
+    Strips are separated by STRIP_RESTART indexes. Every other triangle of a
+    strip is flipped to keep a consistent winding, and the degenerate
+    triangles used to stitch strips together are dropped (they still count to
+    decide the winding of the following triangles).
+
+    Parameters
+    ==========
+
+    indices : numpy.ndarray
+        Flat array of strip indexes
+
+    Returns
+    =======
+
+    faces : numpy.ndarray
+        (F, 3) array of triangles
+    """
+    indices = np.asarray(indices, dtype=INDEX_DTYPE)
+    n = len(indices)
+    if n < 3:
+        return np.zeros((0, 3), dtype=INDEX_DTYPE)
+    restart = indices == STRIP_RESTART
+    # Position of every index within its own strip (-1 for the restarts)
+    strip_start = np.maximum.accumulate(np.where(restart, np.arange(n), -1))
+    position = np.arange(n) - strip_start - 1
+
+    # A triangle ends at every index which is at least the third of its strip
+    last = np.flatnonzero(position[2:] >= 2) + 2
+    faces = np.stack((indices[last - 2], indices[last - 1], indices[last]),
+                     axis=1)
+    odd = (position[last] % 2) == 1
+    faces[odd, 0], faces[odd, 1] = faces[odd, 1], faces[odd, 0].copy()
+
+    degenerate = (faces[:, 0] == faces[:, 1]) | \
+                 (faces[:, 1] == faces[:, 2]) | \
+                 (faces[:, 0] == faces[:, 2])
+    return faces[~degenerate]
+
+
+def stripify(tris):
+    """Greedily join triangles into strips, the inverse of
+    strip_to_triangles().
+
+    Each strip grows through the triangles sharing its last edge, with the
+    winding expected at that position of the strip, and strips are
+    separated by STRIP_RESTART indexes. Degenerate triangles are dropped.
+
+    Parameters
+    ==========
+
+    tris : array_like
+        (T, 3) vertex indices
+
+    Returns
+    =======
+
+    indices : numpy.ndarray
+        Flat uint32 array of strip indexes
+    """
+    tris = np.asarray(tris, dtype=np.int64).reshape(-1, 3).tolist()
+    # Triangles by directed edge, in the order their vertices are given
+    edges = {}
+    for t, (a, b, c) in enumerate(tris):
+        for edge in ((a, b), (b, c), (c, a)):
+            edges.setdefault(edge, []).append(t)
+    used = [a == b or b == c or a == c for a, b, c in tris]
+
+    def next_tri(p, q):
+        # Unused triangle with the directed edge p -> q, and its last vertex
+        for t in edges.get((p, q), ()):
+            if not used[t]:
+                a, b, c = tris[t]
+                return t, (a if (b, c) == (p, q) else
+                           b if (c, a) == (p, q) else c)
+        return None, None
+
+    indices = []
+    for start in range(len(tris)):
+        if used[start]:
+            continue
+        used[start] = True
+        a, b, c = tris[start]
+        # Start with the rotation that can be continued, if any. The second
+        # triangle of the strip is flipped, so it has the last edge reversed
+        strip = [a, b, c]
+        for rotation in ((a, b, c), (b, c, a), (c, a, b)):
+            if next_tri(rotation[2], rotation[1])[0] is not None:
+                strip = list(rotation)
+                break
+        while True:
+            # Odd triangles of the strip are flipped
+            p, q = strip[-2], strip[-1]
+            if len(strip) % 2 == 1:
+                p, q = q, p
+            t, r = next_tri(p, q)
+            if t is None:
+                break
+            used[t] = True
+            strip.append(r)
+        if indices:
+            indices.append(STRIP_RESTART)
+        indices.extend(strip)
+    return np.array(indices, dtype=INDEX_DTYPE)
+
+
+class s3o_model(object):
+    def __init__(self, header=None, root=None):
+        self.header = header if header is not None else s3o_header()
+        self.root = root
+        # Size of the file the model was loaded from, None for new models
+        self.size = None
+        # False for models loaded without their vertices and vertex tables
+        self.geometry = True
+        # Mapped file the piece arrays are views of, see load()
+        self.fdata = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Release the mapped file the model was loaded from.
+
+        The piece arrays still viewing the file are copied first, so the
+        model remains usable, and the file can be overwritten or replaced
+        right away (which Windows refuses while it is mapped). Models not
+        loaded with load() are left untouched.
+        """
+        if self.fdata is None:
+            return
+        for piece in self.pieces():
+            if not piece.verts.flags.owndata:
+                piece.verts = piece.verts.copy()
+            if not piece.indices.flags.owndata:
+                piece.indices = piece.indices.copy()
+        fdata, self.fdata = self.fdata, None
+        try:
+            fdata.close()
+        except BufferError:
+            # Someone else still holds a view, the map is released with it
+            pass
+
+    def pieces(self):
+        """Iterate over all the pieces, parents first."""
+        pending = [self.root] if self.root is not None else []
+        while pending:
+            piece = pending.pop()
+            yield piece
+            pending.extend(reversed(piece.children))
+
+
+def loads(fdata, geometry=True):
+    """Decode a s3o model from a buffer.
+
+    The vertex and index arrays of the pieces are read-only views of fdata.
+
+    Parameters
+    ==========
+
+    fdata : buffer
+        s3o file contents, as bytes, mmap or any object supporting the buffer
+        protocol and find()
+    geometry : bool
+        False to load just the header and the piece hierarchy (names, sizes
+        and offsets), leaving the vertex and index arrays of the pieces empty.
+        Such a model can be inspected, but not saved.
+
+    Returns
+    =======
+
+    model : s3o_model
+        The loaded model
+    """
+    model = s3o_model()
+    model.header.load(fdata)
+    model.size = len(fdata)
+    model.geometry = geometry
+
+    # Walk the tree with an explicit stack, so deep hierarchies can't hit the
+    # recursion limit, and refuse to load the same piece twice, so a cyclic
+    # hierarchy can't loop forever
+    model.root = s3o_piece()
+    pending = [(model.root, model.header.rootPieceOffset)]
+    visited = set()
+    while pending:
+        piece, offset = pending.pop()
+        if offset in visited:
+            raise ValueError(
+                "Corrupt s3o file, %s: already loaded, the hierarchy has a "
+                "cycle or a shared piece" % piece.describe(offset))
+        visited.add(offset)
+        childOffsets = piece.load(fdata, offset, geometry)
+        for childOffset in childOffsets:
+            child = s3o_piece()
+            child.parent = piece
+            piece.children.append(child)
+        pending.extend(reversed(list(zip(piece.children, childOffsets))))
+    return model
+
+
+def load(filename, geometry=True):
+    """Load a s3o model from a file. See loads().
+
+    The file is memory mapped, and stays mapped until the model is closed,
+    see s3o_model.close(), which also works as a context manager:
+
+        with load(filename) as model:
+            ...
+    """
+    with open(filename, "rb") as fhandle:
+        fdata = map_file(fhandle)
+    try:
+        model = loads(fdata, geometry)
+    except BaseException:
+        if isinstance(fdata, mmap.mmap):
+            try:
+                fdata.close()
+            except BufferError:
+                # A piece loaded before the error still views it
+                pass
+        raise
+    if isinstance(fdata, mmap.mmap):
+        model.fdata = fdata
+    return model
+
+
+def scan(filename):
+    """Load just the header and piece hierarchy of a s3o file.
+
+    No vertex nor vertex table is decoded, which makes it suitable to
+    catalogue large amounts of models. See loads().
+    """
+    with load(filename, geometry=False) as model:
+        return model
+
+
+def _name_bytes(name):
+    return name.encode() + b"\0"
+
+
+def _recorded_layout(model):
+    """Blocks to write back at the offsets they were loaded from.
+
+    Returns None if the model was not loaded from a file, or if it was
+    modified in a way that doesn't fit in the original layout anymore.
+    """
+    if model.size is None or model.root is None:
+        return None
+    header = model.header
+    blocks = [(0, header)]
+    for texture, offset in ((header.texture1, header.texture1Offset),
+                            (header.texture2, header.texture2Offset)):
+        if texture and offset:
+            blocks.append((offset, _name_bytes(texture)))
+        elif texture or offset:
+            return None
+    if header.rootPieceOffset != model.root.offset:
+        return None
+    for piece in model.pieces():
+        if piece.offset is None or \
+                piece.numVerts != len(piece.verts) or \
+                piece.vertTableSize != len(piece.indices) or \
+                piece.numChildren != len(piece.children) or \
+                any(child.offset is None for child in piece.children):
+            return None
+        blocks.append((piece.offset, piece))
+        blocks.append((piece.nameOffset, _name_bytes(piece.name)))
+        blocks.append((piece.vertTableOffset, piece.indices))
+        blocks.append((piece.vertsOffset, piece.verts))
+        blocks.append((piece.childrenOffset, np.array(
+            [child.offset for child in piece.children], dtype=INDEX_DTYPE)))
+
+    # The blocks should not overlap nor go beyond the original file
+    def size(block):
+        if isinstance(block, (s3o_header, s3o_piece)):
+            return struct.calcsize(block.binary_format)
+        if isinstance(block, np.ndarray):
+            return block.nbytes
+        return len(block)
+    end = 0
+    for offset, block in sorted(blocks, key=lambda b: b[0]):
+        if size(block) == 0:
+            continue
+        if offset < end:
+            return None
+        end = offset + size(block)
+    if end > model.size:
+        return None
+    return blocks
+
+
+def _compact_layout(model):
+    """Lay the model out one piece after the other, as the exporter does.
+
+    Each piece is followed by its name, vertex table, vertices, children and
+    children offsets list; the texture names are written at the end. All the
+    offsets are computed up front from the sizes of the blocks, and the header
+    and pieces are updated with them.
+
+    Returns
+    =======
+
+    blocks : list
+        (offset, block) pairs
+    size : int
+        Total size of the file
+    """
+    header = model.header
+    header_size = struct.calcsize(header.binary_format)
+    piece_size = struct.calcsize(s3o_piece.binary_format)
+
+    # Parents first, every subtree right after its parent
+    pieces = list(model.pieces())
+    names, arrays, own = {}, {}, {}
+    for piece in pieces:
+        names[piece] = _name_bytes(piece.name)
+        arrays[piece] = (
+            np.ascontiguousarray(piece.indices, dtype=INDEX_DTYPE).ravel(),
+            np.ascontiguousarray(piece.verts, dtype=VERT_DTYPE).reshape(-1, 8))
+        own[piece] = piece_size + len(names[piece]) + \
+            arrays[piece][0].nbytes + arrays[piece][1].nbytes
+    subtree = {}
+    for piece in reversed(pieces):
+        subtree[piece] = own[piece] + 4 * len(piece.children) + \
+            sum(subtree[child] for child in piece.children)
+
+    blocks = [(0, header)]
+    model.root.offset = header_size
+    for piece in pieces:
+        indices, verts = arrays[piece]
+        piece.nameOffset = piece.offset + piece_size
+        piece.vertTableOffset = piece.nameOffset + len(names[piece])
+        piece.vertTableSize = len(indices)
+        piece.vertsOffset = piece.vertTableOffset + indices.nbytes
+        piece.numVerts = len(verts)
+        piece.numChildren = len(piece.children)
+        position = piece.offset + own[piece]
+        for child in piece.children:
+            child.offset = position
+            position += subtree[child]
+        piece.childrenOffset = position
+        blocks.append((piece.offset, piece))
+        blocks.append((piece.nameOffset, names[piece]))
+        blocks.append((piece.vertTableOffset, indices))
+        blocks.append((piece.vertsOffset, verts))
+        blocks.append((piece.childrenOffset, np.array(
+            [child.offset for child in piece.children], dtype=INDEX_DTYPE)))
+
+    size = header_size + subtree[model.root]
+    header.rootPieceOffset = model.root.offset
+    header.texture1Offset = 0
+    if header.texture1:
+        header.texture1Offset = size
+        blocks.append((size, _name_bytes(header.texture1)))
+        size += len(blocks[-1][1])
+    header.texture2Offset = 0
+    if header.texture2:
+        header.texture2Offset = size
+        blocks.append((size, _name_bytes(header.texture2)))
+        size += len(blocks[-1][1])
+    return blocks, size
+
+
+def dumps(model):
+    """Encode a s3o model.
+
+    Models loaded from a file, which still fit in their original layout, are
+    written back at the very same offsets, so an unmodified model gives the
+    same bytes that were loaded. Otherwise the pieces are laid out one after
+    the other, and the offsets of the header and pieces are updated.
+
+    Either way the file is assembled in a single preallocated buffer.
+
+    Parameters
+    ==========
+
+    model : s3o_model
+        The model to encode
+
+    Returns
+    =======
+
+    data : bytearray
+        The s3o file contents
+    """
+    if model.root is None:
+        raise ValueError("The model has no root piece")
+    if not model.geometry:
+        raise ValueError("The model was loaded without geometry")
+    blocks = _recorded_layout(model)
+    if blocks is None:
+        blocks, size = _compact_layout(model)
+    else:
+        size = model.size
+
+    buf = bytearray(size)
+    out = np.frombuffer(buf, dtype=np.uint8)
+    for offset, block in blocks:
+        if isinstance(block, (s3o_header, s3o_piece)):
+            block = block.pack()
+        if isinstance(block, np.ndarray):
+            block = np.ascontiguousarray(block).reshape(-1).view(np.uint8)
+        else:
+            block = np.frombuffer(block, dtype=np.uint8)
+        out[offset:offset + len(block)] = block
+    return buf
+
+
+def dump(model, filename):
+    """Write a s3o model to a file. See dumps().
+
+    The data is written with a single call into a temporary file, in the same
+    folder, which then replaces filename. Hence a failed export never leaves
+    a truncated model behind. If filename already holds the very same bytes,
+    it is left untouched. The model is closed (see s3o_model.close()) before
+    replacing filename, so it can be written over the file it was loaded from.
+
+    Returns
+    =======
+
+    written : bool
+        False if the file was already up to date
+    """
+    data = dumps(model)
+    if same_contents(filename, data):
+        return False
+    model.close()
+    folder = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(
+        prefix="." + os.path.basename(filename) + ".", suffix=".tmp",
+        dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as fhandle:
+            fhandle.write(data)
+        os.chmod(tmpname, _file_mode(filename))
+        os.replace(tmpname, filename)
+    except BaseException:
+        try:
+            os.remove(tmpname)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def _file_mode(filename):
+    """Permissions of filename, or the default ones for a new file (the
+    temporary files are only readable by their owner)"""
+    try:
+        return os.stat(filename).st_mode & 0o7777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def same_contents(filename, data):
+    """Whether filename exists and holds exactly data"""
+    try:
+        if os.path.getsize(filename) != len(data):
+            return False
+        with open(filename, "rb") as fhandle:
+            return fhandle.read() == data
+    except OSError:
+        return False
+
+
+def remove_doubles(verts, tol=1E-6, columns=6):
+    """I would say (J.L. Cercos-Pita aka SanguinarioJoe) this is an upspring
+    fault. Anyway, it is happening that the imported models have duplicated
+    vertices, i.e. vertices that are in the same exact position, and have the
+    same exact normal. It should be noticed that for the sake of the mesh
+    representation, those vertices can be merged.
+    Unfortunatelly, Blender is not dealing ok with such inconsistent mesh, so it
+    is correcting the normals after a wide variety of operations, like entering
+    in edit mode, or exporting the mesh.
+    Thus, this method is checking and merging the vertexes with the same
+    position AND NORMAL. It is also returning a dictionary to translate the
+    original vertice indexes onto the new ones
+
+    verts is a (N, 8) array of vertices, the returned unique vertices are rows
+    of it. Only the first columns are compared: position and normal by
+    default, 8 to also take the UV into account.
+
+    Exact duplicates are collapsed with a single sort. The remaining distinct
+    vertices are hashed into a coarse grid, and only the ones sharing a cell
+    (or lying closer than tol to a cell boundary) are compared against each
+    other, in the same first-come order as a brute force search would.
+    """
+    n = len(verts)
+    if n == 0:
+        return verts[:0], np.zeros(0, dtype=np.int64)
+    keys = np.ascontiguousarray(verts[:, :columns], dtype=np.float64)
+
+    # Collapse the bitwise identical vertices. NaN never compares equal, so
+    # those vertices are tagged with their own index to keep them apart
+    nan = np.isnan(keys).any(axis=1)
+    tags = np.where(nan, np.arange(n), -1).astype(np.float64)
+    bits = np.ascontiguousarray(np.column_stack((keys, tags)))
+    bits = bits.view(np.dtype((np.void, bits.itemsize * (columns + 1)))).ravel()
+    _, first, inverse = np.unique(bits, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    # Distinct vertices, sorted by first occurrence
+    order = np.argsort(first, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    first = first[order]
+    inverse = rank[inverse]
+    dkeys = keys[first]
+    m = len(first)
+
+    # Hash the distinct vertices into a grid much coarser than tol. The grid
+    # is shifted so round coordinates don't fall on the cell boundaries
+    cell = 1024 * tol
+    scaled = (dkeys + 0.318309886 * cell) / cell
+    with np.errstate(invalid="ignore"):
+        base = np.floor(scaled)
+        frac = (scaled - base) * cell
+        low = frac < tol
+        high = cell - frac <= tol
+    base[nan[first]] = np.nan
+    base = np.nan_to_num(base, nan=np.iinfo(np.int64).min).astype(np.int64)
+    # Vertices closer than tol to a cell boundary are hashed on both sides
+    near = np.flatnonzero((low | high).any(axis=1))
+    rows = [np.arange(m)]
+    cells = [base]
+    for r in near.tolist():
+        options = [[0] + [-1] * bool(low[r, i]) + [1] * bool(high[r, i])
+                   for i in range(columns)]
+        shifts = np.array(list(itertools.product(*options))[1:],
+                          dtype=np.int64)
+        rows.append(np.full(len(shifts), r))
+        cells.append(base[r] + shifts)
+    rows = np.concatenate(rows)
+    cells = np.ascontiguousarray(np.concatenate(cells))
+
+    # Gather the vertices sharing a cell with any other one
+    cells = cells.view(np.dtype((np.void, cells.itemsize * columns))).ravel()
+    _, cell_ids, counts = np.unique(cells, return_inverse=True,
+                                    return_counts=True)
+    cell_ids = cell_ids.ravel()
+    crowded = counts[cell_ids] > 1
+    neighbours = {}
+    if crowded.any():
+        by_cell = {}
+        for r, c in zip(rows[crowded].tolist(), cell_ids[crowded].tolist()):
+            by_cell.setdefault(c, []).append(r)
+        for members in by_cell.values():
+            for r in members:
+                neighbours.setdefault(r, set()).update(members)
+
+    # Assign the unique ids following the first occurrence order, matching
+    # each vertex against the earliest unique vertex in tolerance
+    unique_of = np.arange(m)
+    is_unique = np.ones(m, dtype=bool)
+    for r in sorted(neighbours):
+        candidates = sorted(j for j in neighbours[r] if j < r and is_unique[j])
+        for j in candidates:
+            if np.all(np.abs(dkeys[j] - dkeys[r]) < tol):
+                unique_of[r] = j
+                is_unique[r] = False
+                break
+    new_ids = np.cumsum(is_unique) - 1
+    indexes = new_ids[unique_of][inverse]
+
+    return verts[first[is_unique]], indexes
+
+
+def drop_unreferenced(verts, indices):
+    """Remove the vertices not used by any primitive.
+
+    Parameters
+    ==========
+
+    verts : numpy.ndarray
+        (N, 8) vertices
+    indices : numpy.ndarray
+        Vertex indices, of any shape
+
+    Returns
+    =======
+
+    verts : numpy.ndarray
+        (M, 8) referenced vertices, in their original order
+    indices : numpy.ndarray
+        Remapped vertex indices, with the same shape and dtype
+    """
+    indices = np.asarray(indices)
+    used = np.zeros(len(verts), dtype=bool)
+    used[indices.ravel()] = True
+    remap = np.cumsum(used) - 1
+    return verts[used], remap[indices].astype(indices.dtype)
+
+
+def weld_vertices(verts, indices, tol=1E-6):
+    """Merge the vertices sharing position, normal and UV (within tol), and
+    drop the unreferenced ones. See remove_doubles().
+
+    Parameters
+    ==========
+
+    verts : numpy.ndarray
+        (N, 8) vertices
+    indices : numpy.ndarray
+        Vertex indices, of any shape
+    tol : float
+        Maximum difference of every component for two vertices to be merged
+
+    Returns
+    =======
+
+    verts : numpy.ndarray
+        (M, 8) welded vertices
+    indices : numpy.ndarray
+        Remapped vertex indices, with the same shape and dtype
+    """
+    indices = np.asarray(indices)
+    unique, ids = remove_doubles(verts, tol, columns=8)
+    return drop_unreferenced(unique, ids[indices].astype(indices.dtype))
+
+
+# Tom Forsyth's "Linear-Speed Vertex Cache Optimisation" parameters
+VERTEX_CACHE_SIZE = 32
+CACHE_DECAY_POWER = 1.5
+LAST_TRI_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+
+def acmr(tris, cache_size=VERTEX_CACHE_SIZE):
+    """Average cache miss ratio of a triangle list, i.e. the number of
+    vertices transformed per triangle, for a FIFO post-transform cache.
+
+    Parameters
+    ==========
+
+    tris : array_like
+        (T, 3) vertex indices
+    cache_size : int
+        Number of vertices held by the cache
+
+    Returns
+    =======
+
+    ratio : float
+        Between 0.5 (ideal) and 3 (no reuse at all). 0 for empty lists
+    """
+    flat = np.asarray(tris).ravel().tolist()
+    if not flat:
+        return 0.0
+    fifo = collections.deque()
+    cached = set()
+    misses = 0
+    for v in flat:
+        if v in cached:
+            continue
+        misses += 1
+        fifo.append(v)
+        cached.add(v)
+        if len(fifo) > cache_size:
+            cached.discard(fifo.popleft())
+    return misses / (len(flat) / 3)
+
+
+def optimize_vertex_cache(tris, nverts=None, cache_size=VERTEX_CACHE_SIZE):
+    """Reorder the triangles to make the most of the post-transform vertex
+    cache, following Tom Forsyth's algorithm. The winding of each triangle is
+    kept.
+
+    Parameters
+    ==========
+
+    tris : array_like
+        (T, 3) vertex indices
+    nverts : int
+        Number of vertices, max(tris) + 1 if None
+    cache_size : int
+        Number of vertices held by the simulated LRU cache
+
+    Returns
+    =======
+
+    tris : numpy.ndarray
+        (T, 3) uint32 reordered vertex indices
+    """
+    tris = np.asarray(tris, dtype=np.int64).reshape(-1, 3)
+    ntris = len(tris)
+    if ntris == 0:
+        return tris.astype(INDEX_DTYPE)
+    if nverts is None:
+        nverts = int(tris.max()) + 1
+
+    # Triangles using each vertex
+    flat = tris.ravel()
+    counts = np.bincount(flat, minlength=nverts)
+    starts = np.concatenate(([0], np.cumsum(counts))).tolist()
+    owners = (np.argsort(flat, kind="stable") // 3).tolist()
+    vert_tris = [owners[starts[v]:starts[v + 1]] for v in range(nverts)]
+    live = counts.tolist()
+
+    # Score lookup tables, for cache positions (-1 meaning out of the cache)
+    # and for the number of triangles still using the vertex
+    cache_table = [0.0, LAST_TRI_SCORE, LAST_TRI_SCORE, LAST_TRI_SCORE]
+    scaler = 1.0 / (cache_size - 3)
+    cache_table += [(1.0 - (pos - 3) * scaler) ** CACHE_DECAY_POWER
+                    for pos in range(3, cache_size)]
+    valence_table = [VALENCE_BOOST_SCALE * n ** -VALENCE_BOOST_POWER
+                     if n else 0.0 for n in range(max(live) + 1)]
+
+    def score(v):
+        if not live[v]:
+            return -1.0
+        return cache_table[cache_pos[v] + 1] + valence_table[live[v]]
+
+    cache_pos = [-1] * nverts
+    vert_score = [score(v) for v in range(nverts)]
+    tri_list = tris.tolist()
+    tri_score = [vert_score[a] + vert_score[b] + vert_score[c]
+                 for a, b, c in tri_list]
+    added = [False] * ntris
+
+    order = []
+    cache = []
+    best = max(range(ntris), key=tri_score.__getitem__)
+    next_tri = 0
+    while True:
+        tri = tri_list[best]
+        added[best] = True
+        order.append(best)
+        for v in tri:
+            live[v] -= 1
+            vert_tris[v].remove(best)
+
+        cache = tri + [v for v in cache if v not in tri]
+        evicted = cache[cache_size:]
+        cache = cache[:cache_size]
+        for v in evicted:
+            cache_pos[v] = -1
+        for pos, v in enumerate(cache):
+            cache_pos[v] = pos
+
+        # Update the scores of the affected vertices and triangles
+        for v in itertools.chain(cache, evicted):
+            new_score = score(v)
+            delta = new_score - vert_score[v]
+            if delta:
+                vert_score[v] = new_score
+                for t in vert_tris[v]:
+                    tri_score[t] += delta
+
+        if len(order) == ntris:
+            break
+
+        # Best triangle around the cache or, failing that, the first one left
+        best, best_score = -1, -1.0
+        for v in cache:
+            for t in vert_tris[v]:
+                if tri_score[t] > best_score:
+                    best, best_score = t, tri_score[t]
+        if best < 0:
+            while added[next_tri]:
+                next_tri += 1
+            best = next_tri
+
+    return tris[order].astype(INDEX_DTYPE)
+
+
+def reorder_vertices(verts, indices):
+    """Sort the vertices by first use in the index table, so the vertex
+    fetches follow the triangle order. Unreferenced vertices are moved to the
+    end.
+
+    Parameters
+    ==========
+
+    verts : numpy.ndarray
+        (N, 8) vertices
+    indices : numpy.ndarray
+        Vertex indices, of any shape
+
+    Returns
+    =======
+
+    verts : numpy.ndarray
+        (N, 8) reordered vertices
+    indices : numpy.ndarray
+        Remapped vertex indices, with the same shape and dtype
+    """
+    indices = np.asarray(indices)
+    flat = indices.ravel().astype(np.int64)
+    used, first = np.unique(flat, return_index=True)
+    unused = np.setdiff1d(np.arange(len(verts)), used)
+    order = np.concatenate((used[np.argsort(first, kind="stable")], unused))
+    remap = np.empty(len(verts), dtype=np.int64)
+    remap[order] = np.arange(len(verts))
+    return verts[order], remap[flat].astype(indices.dtype).reshape(indices.shape)
+
+
+def remove_degenerate(verts, tris, tol=1E-6):
+    """Remove the degenerate triangles: the ones using a vertex more than
+    once or out of range vertices, and the ones with no area, i.e. whose
+    height over their longest edge is below tol times that edge length.
+
+    Parameters
+    ==========
+
+    verts : numpy.ndarray
+        (N, 8) vertices
+    tris : numpy.ndarray
+        (T, 3) triangles
+    tol : float
+        Relative area threshold
+
+    Returns
+    =======
+
+    tris : numpy.ndarray
+        (M, 3) remaining triangles, in their original order
+    """
+    tris = np.asarray(tris).reshape(-1, 3)
+    keep = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & \
+        (tris[:, 2] != tris[:, 0]) & (tris < len(verts)).all(axis=1)
+    tris = tris[keep]
+    pos = np.asarray(verts[:, :3], dtype=np.float64)[tris]
+    edges = pos[:, [1, 2, 0]] - pos
+    area2 = np.linalg.norm(np.cross(edges[:, 0], edges[:, 1]), axis=1)
+    longest2 = (edges ** 2).sum(axis=2).max(axis=1)
+    return tris[area2 > tol * longest2]
+
+
+def find_base_plate(verts, faces, max_angle=10.0):
+    """Find the base plate, i.e. a horizontal, downwards facing square quad
+    or pair of adjacent triangles, the way the exporter does.
+
+    The faces are visited in order, and the first downwards facing quad
+    which is square, or triangle sharing an edge (by vertex position) with
+    another downwards facing triangle, is taken as the base plate.
+
+    Parameters
+    ==========
+
+    verts : numpy.ndarray
+        (N, 8) vertices, in the s3o axes (Y up)
+    faces : numpy.ndarray
+        (F, 3) triangles or (F, 4) quads
+    max_angle : float
+        Maximum angle, in degrees, between the face normals and the -Y axis
+
+    Returns
+    =======
+
+    plate : numpy.ndarray
+        Indices of the base plate faces, empty if there is none
+    """
+    faces = np.asarray(faces)
+    none = np.zeros(0, dtype=np.int64)
+    if not len(faces):
+        return none
+    pos = np.asarray(verts[:, :3], dtype=np.float64)
+    corners = pos[faces]
+    # Quads are taken as planar, the normal of their first triangle is used
+    normals = np.cross(corners[:, 1] - corners[:, 0],
+                       corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    down = np.flatnonzero(
+        (lengths > 0) &
+        (-normals[:, 1] >= np.cos(np.radians(max_angle)) * lengths))
+    if not len(down):
+        return none
+
+    if faces.shape[1] == 4:
+        sides = corners[down][:, [1, 2, 3, 0]] - corners[down]
+        sizes = np.linalg.norm(sides, axis=2)
+        cosines = np.abs((sides * sides[:, [1, 2, 3, 0]]).sum(axis=2)) / \
+            np.maximum(sizes * sizes[:, [1, 2, 3, 0]], 1E-30)
+        # Right angles within 1E-3 radians, equal sides within 1E-3
+        square = (cosines < np.sin(1E-3)).all(axis=1) & \
+            (np.ptp(sizes, axis=1) < 1E-3 * sizes.max(axis=1))
+        square = np.flatnonzero(square)
+        return down[square[:1]]
+
+    # Pair the triangles through their edges, vertices being identified by
+    # their position alone
+    used = np.unique(faces[down])
+    _, ids = remove_doubles(verts[used], columns=3)
+    remap = np.zeros(len(verts), dtype=np.int64)
+    remap[used] = ids
+    tris = remap[faces[down]]
+    owners = {}
+    for i, tri in enumerate(tris.tolist()):
+        for k in range(3):
+            edge = tuple(sorted((tri[k], tri[(k + 1) % 3])))
+            owners.setdefault(edge, []).append(i)
+    for i, tri in enumerate(tris.tolist()):
+        for k in range(3):
+            edge = tuple(sorted((tri[k], tri[(k + 1) % 3])))
+            for j in owners[edge]:
+                if j != i:
+                    return down[[i, j]]
+    return none
+
+
+def ritter_sphere(points, max_iterations=1000):
+    """Approximate bounding sphere, by Ritter's method.
+
+    Parameters
+    ==========
+
+    points : numpy.ndarray
+        (N, 3) points
+    max_iterations : int
+        Maximum number of growing steps
+
+    Returns
+    =======
+
+    center : numpy.ndarray
+        Sphere center, the origin if there are no points
+    radius : float
+        Sphere radius
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if not len(points):
+        return np.zeros(3), 0.0
+    far = points[np.argmax(np.sum((points - points[0]) ** 2, axis=1))]
+    other = points[np.argmax(np.sum((points - far) ** 2, axis=1))]
+    center = (far + other) / 2
+    radius = np.linalg.norm(other - far) / 2
+    # Grow the sphere to cover the farthest point left out, until none is
+    for _ in range(max_iterations):
+        dists = np.linalg.norm(points - center, axis=1)
+        i = np.argmax(dists)
+        if dists[i] <= radius:
+            return center, float(radius)
+        new_radius = (radius + dists[i]) / 2
+        center = center + (points[i] - center) * ((dists[i] - new_radius) / dists[i])
+        new_radius = max(new_radius, np.linalg.norm(points[i] - center))
+        if new_radius <= radius:
+            # The point is out by rounding errors only, no progress is made
+            break
+        radius = new_radius
+    # Enclose every point from the current center
+    return center, float(np.max(np.linalg.norm(points - center, axis=1)))
+
+
+def _circumsphere(points):
+    """Smallest sphere with all the (up to 4) points on its surface, or None
+    for degenerate sets."""
+    p0 = points[0]
+    if len(points) == 1:
+        return p0, 0.0
+    if len(points) == 2:
+        return (p0 + points[1]) / 2, np.linalg.norm(points[1] - p0) / 2
+    if len(points) == 3:
+        a, b = points[1] - p0, points[2] - p0
+        axb = np.cross(a, b)
+        den = 2 * np.dot(axb, axb)
+        if den <= 1E-12 * np.dot(a, a) * np.dot(b, b):
+            return None
+        offset = np.cross(np.dot(a, a) * b - np.dot(b, b) * a, axb) / den
+        return p0 + offset, np.linalg.norm(offset)
+    m = 2 * (points[1:] - p0)
+    rhs = np.sum(points[1:] ** 2 - p0 ** 2, axis=1)
+    try:
+        center = np.linalg.solve(m, rhs)
+    except np.linalg.LinAlgError:
+        return None
+    if not np.all(np.isfinite(center)):
+        return None
+    return center, np.linalg.norm(center - p0)
+
+
+def _min_sphere(points, eps):
+    """Minimal sphere enclosing a handful of points, by brute force over all
+    the subsets which may define it (Welzl's basis cases)."""
+    best = None
+    for k in range(1, min(len(points), 4) + 1):
+        for subset in itertools.combinations(range(len(points)), k):
+            sphere = _circumsphere(points[list(subset)])
+            if sphere is None:
+                continue
+            center, radius = sphere
+            if best is not None and radius >= best[1]:
+                continue
+            if np.all(np.linalg.norm(points - center, axis=1) <= radius + eps):
+                best = (center, radius)
+    return best
+
+
+def bounding_sphere(points, max_iterations=1000):
+    """Minimal enclosing sphere of a set of points.
+
+    Welzl's problem is solved by pivoting: the current sphere is defined by a
+    small support set, and every iteration adds the farthest point left out
+    (found with a single vectorized pass) to the support, solving it exactly.
+    Ritter's sphere is returned instead if that doesn't converge.
+
+    Parameters
+    ==========
+
+    points : numpy.ndarray
+        (N, 3) points. The non finite ones are ignored
+    max_iterations : int
+        Maximum number of pivoting steps
+
+    Returns
+    =======
+
+    center : numpy.ndarray
+        Sphere center, the origin if there are no (finite) points
+    radius : float
+        Sphere radius
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    points = points[np.all(np.isfinite(points), axis=1)]
+    if not len(points):
+        return np.zeros(3), 0.0
+    ritter = ritter_sphere(points, max_iterations)
+    eps = 1E-9 * max(ritter[1], 1.0)
+
+    support = points[:1]
+    center, radius = points[0], 0.0
+    for _ in range(max_iterations):
+        dists = np.linalg.norm(points - center, axis=1)
+        i = np.argmax(dists)
+        if dists[i] <= radius + eps:
+            return center, float(radius)
+        sphere = _min_sphere(np.vstack((support, points[i:i + 1])), eps)
+        if sphere is None or sphere[1] <= radius:
+            break
+        center, radius = sphere
+        # Keep only the points on the surface, which define the sphere
+        dists = np.linalg.norm(support - center, axis=1)
+        support = np.vstack((support[np.abs(dists - radius) <= eps],
+                             points[i:i + 1]))
+    return ritter
+
+
+def model_points(model):
+    """All the vertex positions of a model, in the model space (s3o axes),
+    i.e. moved by the offsets of their piece and its parents.
+
+    Parameters
+    ==========
+
+    model : s3o_model
+        The model, loaded with geometry
+
+    Returns
+    =======
+
+    points : numpy.ndarray
+        (N, 3) float64 positions
+    """
+    points = []
+    pending = [(model.root, np.zeros(3))] if model.root is not None else []
+    while pending:
+        piece, origin = pending.pop()
+        origin = origin + (piece.xoffset, piece.yoffset, piece.zoffset)
+        if len(piece.verts):
+            points.append(np.asarray(piece.verts[:, :3], dtype=np.float64) + origin)
+        pending.extend((child, origin) for child in piece.children)
+    if not points:
+        return np.zeros((0, 3))
+    return np.concatenate(points)
+
+
+def estimate_bounds(model):
+    """Estimate the collision sphere and height of a model from its vertices.
+
+    Parameters
+    ==========
+
+    model : s3o_model
+        The model, loaded with geometry
+
+    Returns
+    =======
+
+    center : numpy.ndarray
+        Center of the minimal enclosing sphere (midx, midy, midz), in the s3o
+        axes. None if the model has no (finite) vertices
+    radius : float
+        Radius of the minimal enclosing sphere
+    height : float
+        Vertical (y) extent of the model
+    """
+    points = model_points(model)
+    points = points[np.all(np.isfinite(points), axis=1)]
+    if not len(points):
+        return None, 0.0, 0.0
+    center, radius = bounding_sphere(points)
+    height = float(points[:, 1].max() - points[:, 1].min())
+    return center, radius, height
+
+
+def valid_faces(faces, vertids):
+    """Faces that can be built with the merged vertices
+
+    Faces referencing missing vertices, faces that collapse after the
+    duplicated vertices are merged, and faces repeating the vertices of a
+    previous one are discarded.
+
+    Parameters
+    ==========
+
+    faces : numpy.ndarray
+        (F, 3) triangles or (F, 4) quads
+    vertids : numpy.ndarray
+        Merged vertex index of every original vertex, see remove_doubles()
+
+    Returns
+    =======
+
+    faces : numpy.ndarray
+        Valid faces, as original vertex indexes (to get the UVs)
+    polys : numpy.ndarray
+        Valid faces, as merged vertex indexes
+    """
+    faces = faces.astype(np.int64)
+    faces = faces[(faces < len(vertids)).all(axis=1)]
+    polys = np.asarray(vertids)[faces]
+    sorted_polys = np.sort(polys, axis=1)
+    valid = np.flatnonzero(
+        (sorted_polys[:, 1:] != sorted_polys[:, :-1]).all(axis=1))
+    sorted_polys = np.ascontiguousarray(sorted_polys[valid])
+    keys = sorted_polys.view(
+        np.dtype((np.void, sorted_polys.itemsize * sorted_polys.shape[1])))
+    _, first = np.unique(keys.ravel(), return_index=True)
+    valid = valid[np.sort(first)]
+    return faces[valid], polys[valid]
+
+
+class piece_mesh(object):
+    """The Blender independent part of the import of a piece: its vertices,
+    merged by position and normal, and its valid faces with their UVs, in the
+    Blender axes.
+
+    It just holds a few compact arrays, so it can be built in another process
+    and pickled, see preparse().
+    """
+    def __init__(self, piece):
+        verts = swap_axes(piece.verts)
+        # The original vertices are kept for the UVs
+        unique, vertids = remove_doubles(verts)
+        faces = piece.faces()
+        valid, polys = valid_faces(faces, vertids)
+        self.numVerts = len(verts)
+        self.numFaces = len(faces)
+        # (U, 3) merged vertex positions
+        self.co = np.ascontiguousarray(unique[:, 0:3], dtype=np.float32)
+        # (F, 3) or (F, 4) faces, as merged vertex indexes
+        self.polys = np.ascontiguousarray(polys, dtype=np.int32)
+        # (F * width, 2) UV of every face corner
+        self.uvs = np.ascontiguousarray(verts[valid.ravel(), 6:8],
+                                        dtype=np.float32)
+
+
+def prepare_mesh(piece, timer=None):
+    """Build the piece_mesh of a piece, unless it was already prepared.
+
+    Parameters
+    ==========
+
+    piece : s3o_piece
+        Loaded piece. The result is kept in piece.mesh
+    timer : phase_timer
+        Collects the time spent in the "dedup" phase
+
+    Returns
+    =======
+
+    mesh : piece_mesh
+        The prepared geometry
+    """
+    if piece.mesh is None:
+        if timer is None:
+            timer = phase_timer()
+        with timer.phase("dedup"):
+            piece.mesh = piece_mesh(piece)
+        timer.count("dedup", verts=piece.mesh.numVerts,
+                    unique_verts=len(piece.mesh.co))
+    return piece.mesh
+
+
+def preparse(filename, timer=None):
+    """Load a model and prepare the geometry of all its pieces for the
+    importer, see prepare_mesh().
+
+    This is the CPU heavy part of the import, which doesn't need Blender. The
+    vertex and index arrays are released, so the model is small to pickle
+    (e.g. from a multiprocessing pool), and can't be saved anymore.
+
+    Parameters
+    ==========
+
+    filename : str
+        The s3o file
+    timer : phase_timer
+        Collects the time spent in the "parse" and "dedup" phases
+
+    Returns
+    =======
+
+    model : s3o_model
+        The model, with the prepared meshes in piece.mesh
+    """
+    if timer is None:
+        timer = phase_timer()
+    with timer.phase("parse"):
+        model = load(filename)
+    pieces = list(model.pieces())
+    timer.count("parse", bytes=model.size, pieces=len(pieces))
+    for piece in pieces:
+        prepare_mesh(piece, timer)
+        piece.verts = piece.verts[:0].copy()
+        piece.indices = piece.indices[:0].copy()
+    model.geometry = False
+    model.close()
+    return model
+
+
+class phase_timer(object):
+    """Wall time and element counts of the phases of an import or export.
+
+    Phases with the same name (e.g. one per piece) are accumulated, and kept
+    in the order they first ran:
+
+        timer = phase_timer()
+        with timer.phase("parse"):
+            model = load(filename)
+        timer.count("parse", pieces=len(list(model.pieces())))
+        print(timer.summary())
+    """
+    def __init__(self):
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name, **counts):
+        """Time the enclosed block as (part of) the phase name"""
+        self.count(name, **counts)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name]["seconds"] += time.perf_counter() - start
+
+    def count(self, name, **counts):
+        """Add element counts to the phase name"""
+        record = self.phases.setdefault(name, {"seconds": 0.0})
+        for key, value in counts.items():
+            record[key] = record.get(key, 0) + value
+
+    def total(self):
+        return sum(record["seconds"] for record in self.phases.values())
+
+    def summary(self):
+        """One line report, e.g. to be shown by an operator"""
+        items = []
+        for name, record in self.phases.items():
+            counts = ", ".join("%s=%s" % (key, value)
+                               for key, value in record.items()
+                               if key != "seconds")
+            items.append("%s %.1f ms" % (name, record["seconds"] * 1000) +
+                         (" (" + counts + ")" if counts else ""))
+        return "; ".join(items)
+
+    def dump(self, filename=None, **fields):
+        """Append one JSON line per phase to filename, or to the file in the
+        S3O_TIMINGS environment variable. Nothing is written if neither is
+        set. The extra fields (e.g. the model file) are added to every line.
+        """
+        filename = filename or os.environ.get("S3O_TIMINGS")
+        if not filename:
+            return
+        with open(filename, "a") as fhandle:
+            for name, record in self.phases.items():
+                line = dict(fields, phase=name)
+                line.update(record)
+                fhandle.write(json.dumps(line) + "\n")
+
+
+# Nothing to register: enabling this module as an add-on is harmless, but not
+# needed by the importer and exporter, which just import it
+def register():
+    pass
+
+
+def unregister():
+    pass
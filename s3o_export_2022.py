@@ -1,15 +1,15 @@
 import bmesh
 import bpy
 import math
-from mathutils import Matrix
 import time
+from concurrent.futures import ThreadPoolExecutor
 from bpy.props import BoolProperty, StringProperty  # , EnumProperty
 from bpy_extras.io_utils import ExportHelper
 import os
-import struct
 from math import radians
 import numpy as np
-import itertools
+
+import s3o_codec
 
 # from struct import calcsize, unpack
 
@@ -35,6 +35,9 @@ bl_info = {
 }
 
 SPLIT_UVS = True
+# Precision used to tell apart UVs and normals when splitting vertices
+UV_QUANTUM = 1E-5
+NORMAL_QUANTUM = 1E-4
 
 try:
 	os.SEEK_SET
@@ -100,226 +103,62 @@ def read_string(file, offset):
 	return string
 
 
-# Example usage: apply_transform(bpy.context.object, use_location=False, use_rotation=True, use_scale=True)
-def apply_transform(obj, use_location=False, use_rotation=False, use_scale=False):
-	mb = obj.matrix_basis
-	I = Matrix()
-	loc, rot, scale = mb.decompose()
-
-	# rotation
-	T = Matrix.Translation(loc)
-	# R = rot.to_matrix().to_4x4()
-	R = mb.to_3x3().normalized().to_4x4()
-	S = Matrix.Diagonal(scale).to_4x4()
-
-	transform = [I, I, I]
-	basis = [T, R, S]
-
-	def swap(i):
-		transform[i], basis[i] = basis[i], transform[i]
-
-	if use_location:
-		swap(0)
-	if use_rotation:
-		swap(1)
-	if use_scale:
-		swap(2)
-
-	M = transform[0] @ transform[1] @ transform[2]
-	if hasattr(obj.data, "transform"):
-		obj.data.transform(M)
-	for c in obj.children:
-		c.matrix_local = M @ c.matrix_local
-
-	obj.matrix_basis = basis[0] @ basis[1] @ basis[2]
-
-class s3o_header(object):
-	binary_format = '<12sI5f4I'  # .encode()
-	magic = b'Spring unit'  # char [12] "Spring unit\0"
-	version = 0  # uint = 0
-	radius = 0.0  # float: radius of collision sphere
-	height = 0.0  # float: height of whole object
-	midx = 0.0  # float offset from origin
-	midy = 0.0  #
-	midz = 0.0  #
-	rootPieceOffset = 0  # offset of root piece
-	collisionDataOffset = 0  # offset of collision data, 0 = no data
-	texture1Offset = 0  # offset to filename of 1st texture
-	texture2Offset = 0  # offset to filename of 2nd texture
-
-	def save(self, file):
-		s = struct.pack(self.binary_format,
-						self.magic,
-						self.version,
-						self.radius,
-						self.height,
-						self.midx,
-						self.midy,
-						self.midz,
-						self.rootPieceOffset,
-						self.collisionDataOffset,
-						self.texture1Offset,
-						self.texture2Offset
-						)
-		print(s)
-		file.write(s)
+def strip_suffix(name):
+	"""Remove the name-clash suffix added by Blender to same-named objects,
+	e.g. "thruster.L.001" becomes "thruster.L"
 
+	Parameters
+	==========
+	name : string
+		Blender object name
+
+	Returns
+	=======
+	name : string
+		The name without the numeric suffix
+	"""
+	split_name = name.split(".")
+	if len(split_name) > 1 and split_name[-1].isdigit():
+		new_name = ".".join(split_name[:-1])
+		print("\tBlender name: " + name + ", saved name: " + new_name)
+		return new_name
+	return name
 
-class s3o_piece(object):
-	binary_format = "<10I3f"
 
+class s3o_piece(s3o_codec.s3o_piece):
 	mesh = None # #
-	parent = None   # # ''
-	name = ''
-	verts = []
-	polygons = []
-	children = []
-
-	nameOffset = 0  # uint
-	numChildren = 0  # uint
-	childrenOffset = 0  # uint
-	numVerts = 0  # uint
-	vertsOffset = 0  # uint
-	vertType = 0  # uint
-	primitiveType = 0  # 0 = tri, 1 = tristrips, 2 = quads
-	vertTableSize = 0  # number of indexes in vert table
-	vertTableOffset = 0
-	collisionDataOffset = 0
-	xoffset = 0.0
-	yoffset = 0.0
-	zoffset = 0.0
-
-	def write_primitives(self, file):
+
+	def __init__(self):
+		super().__init__()
+		self.polygons = np.zeros((0, 3), dtype=np.uint32)
+
+	def set_primitives(self, use_strips=False):
 		# check if they're all quads, if so we can save it as quads rather than tris
-		allquads = True
-		for f in self.polygons:
-			if len(f) != 4:
-				allquads = False
-				break
+		allquads = len(self.polygons) == 0 or self.polygons.shape[1] == 4
 
 		if allquads:
 			self.primitiveType = 2
-			for f in self.polygons:
-				data = struct.pack("<4I", f[0], f[1], f[2], f[3])
-				file.write(data)
+			tris = self.polygons[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 3) if len(self.polygons) else []
 		else:
 			self.primitiveType = 0
-			for f in self.polygons:
-				data = struct.pack("<3I", f[0], f[1], f[2])
-				file.write(data)
-
-	# Takes a piece (initially, the root piece, then recurses children)
-	def save(self, file, remove_suffix=True):
-		print("saving piece [" + self.name + "]")
-
-		startpos = file.tell()
-		# seek forward the size of a piece header
-		file.seek(struct.calcsize(self.binary_format), os.SEEK_CUR)
-		# write name
-		self.nameOffset = file.tell()
-
-		if remove_suffix:
-			split_name = self.name.split(".")
-			split_name_len = len(split_name)
-			if split_name_len > 1:
-				suffix = split_name[-1]  # last element (eg: 001 within thruster.L.001)
-				if suffix.isdigit():
-					new_name = ""
-					for i in range(split_name_len):
-						if i < (split_name_len - 1):
-							if i > 0:
-								new_name = new_name + "."
-							new_name = new_name + split_name[i]
-					print("\tBlender name: " + self.name + ", saved name: " + new_name)
-					self.name = new_name
-
-		file.write(self.name.encode() + b"\0")  # # self.name -- TODO: wip - encode("UTF-8")
-		# (self, s: Union[bytes, bytearray])
-
-		# write vert table
-		self.vertTableOffset = file.tell()
-		self.write_primitives(file)
-		if self.primitiveType == 2:
-			self.vertTableSize = len(self.polygons) * 4
-		else:
-			self.vertTableSize = len(self.polygons) * 3
-
-		# write verts
-		self.vertsOffset = file.tell()
-		for v in self.verts:
-			v.save(file)
-
+			tris = self.polygons
+		self.indices = np.ascontiguousarray(self.polygons, dtype=s3o_codec.INDEX_DTYPE).ravel()
+
+		# Triangle strips, if they need fewer indices
+		if use_strips and len(tris):
+			strips = s3o_codec.stripify(tris)
+			if len(strips) < len(self.indices):
+				self.primitiveType = 1
+				self.indices = strips
+		if len(tris):
+			encoding = ("triangles", "triangle strips", "quads")[self.primitiveType]
+			print("\tEncoded as " + encoding + ": " + str(len(self.indices)) + " indices, " +
+			      str(3 * len(tris) - len(self.indices)) + " fewer than triangles")
+		self.vertTableSize = len(self.indices)
 		self.numVerts = len(self.verts)
 
-		self.numChildren = len(self.children)
-		print("saving " + str(self.numChildren) + " children")
-		childOffsetList = []
-		# save children
-		for c in self.children:
-			childOffsetList.append(file.tell())
-			c.save(file, remove_suffix)
-		# write child offset list
-		self.childrenOffset = file.tell()
-		for c in childOffsetList:
-			data = struct.pack("<I", c)
-			file.write(data)
-
-		# record end pos
-		endpos = file.tell()
-
-		# jump back to the beginning
-		file.seek(startpos, os.SEEK_SET)
-
-		# write piece header
-		data = struct.pack(self.binary_format,
-						   self.nameOffset,
-						   self.numChildren,
-						   self.childrenOffset,
-						   self.numVerts,
-						   self.vertsOffset,
-						   self.vertType,
-						   self.primitiveType,
-						   self.vertTableSize,
-						   self.vertTableOffset,
-						   self.collisionDataOffset,
-						   self.xoffset,
-						   self.yoffset,
-						   self.zoffset)
-		file.write(data)
-
-		# jump back to the end ready for the next piece
-		file.seek(endpos, os.SEEK_SET)
-		print("done [" + self.name + "]")
-
 	def get_verts(self):
-		tmp_verts = []
-		for i in range(0, len(self.verts)):
-			tmp_verts.append([self.verts[i].xpos, self.verts[i].ypos, self.verts[i].zpos])
-		return tmp_verts
-
-
-class s3o_vert(object):
-	binary_format = "<8f"
-	xpos = 0.0
-	ypos = 0.0
-	zpos = 0.0
-	xnormal = 0.0
-	ynormal = 0.0
-	znormal = 0.0
-	texu = float (0)  # 0.0
-	texv = float(0)   # 0.0
-
-	def save(self, file):
-		data = struct.pack(self.binary_format,
-						   self.xpos,
-						   self.ypos,
-						   self.zpos,
-						   self.xnormal,
-						   self.ynormal,
-						   self.znormal,
-						   self.texu,
-						   self.texv)
-		file.write(data)
+		return self.verts[:, 0:3].tolist()
 
 
 def asciiz(s):
@@ -328,189 +167,327 @@ def asciiz(s):
 		n = n + 1
 	return s[0:n]
 
-def ProcessPiece(piece, scene):  # Empty or Mesh, will recurse through children
+def corner_normals(mesh):
+	"""Per-loop (split) normals of a mesh, as a (L, 3) float32 array"""
+	normals = np.empty(len(mesh.loops) * 3, dtype=np.float32)
+	if hasattr(mesh, "corner_normals"):
+		# Blender >= 4.1
+		mesh.corner_normals.foreach_get("vector", normals)
+	else:
+		mesh.calc_normals_split()
+		mesh.loops.foreach_get("normal", normals)
+		mesh.free_normals_split()
+	return normals.reshape(-1, 3)
+
+
+def face_normals(mesh):
+	"""Polygon normals of a mesh, as a (F, 3) float32 array"""
+	normals = np.empty(len(mesh.polygons) * 3, dtype=np.float32)
+	if hasattr(mesh, "polygon_normals"):
+		# Blender >= 4.1
+		mesh.polygon_normals.foreach_get("vector", normals)
+	else:
+		mesh.polygons.foreach_get("normal", normals)
+	return normals.reshape(-1, 3)
+
+
+def extract_geometry(mesh, use_quads=False, timer=None):
+	"""Fetch the vertices and triangles (or quads) of a mesh as s3o arrays.
+
+	s3o vertices carry a single UV and normal, so every mesh vertex is split
+	in as many s3o vertices as different (UV, normal) pairs its loops have,
+	e.g. along UV seams and sharp edges. UVs and normals are quantized to
+	UV_QUANTUM and NORMAL_QUANTUM to tell them apart. The mesh is only read.
+
+	Parameters
+	==========
+	mesh : bpy.types.Mesh
+		The mesh, in the piece local space
+	use_quads : bool
+		Return the polygons themselves if they are all quads
+	timer : s3o_codec.phase_timer
+		Collects the time spent in the "extraction" and "UV split" phases
+
+	Returns
+	=======
+	verts : numpy.ndarray
+		(N, 8) float32 array of vertices, in the s3o axes
+	polygons : numpy.ndarray
+		(T, 3) uint32 array of triangle vertex indices, or (Q, 4) for quads
+	"""
+	if timer is None:
+		timer = s3o_codec.phase_timer()
+	with timer.phase("extraction"):
+		mesh.calc_loop_triangles()
+		nverts = len(mesh.vertices)
+		co = np.empty(nverts * 3, dtype=np.float32)
+		mesh.vertices.foreach_get("co", co)
+		co = co.reshape(-1, 3)
+
+		npolys = len(mesh.polygons)
+		totals = np.empty(npolys, dtype=np.int32)
+		mesh.polygons.foreach_get("loop_total", totals)
+		if use_quads and npolys and np.all(totals == 4):
+			width = 4
+			starts = np.empty(npolys, dtype=np.int32)
+			mesh.polygons.foreach_get("loop_start", starts)
+			tri_loops = (starts[:, None] + np.arange(4, dtype=np.int32)).ravel()
+		else:
+			width = 3
+			ntris = len(mesh.loop_triangles)
+			tri_loops = np.empty(ntris * 3, dtype=np.int32)
+			mesh.loop_triangles.foreach_get("loops", tri_loops)
+		nloops = len(mesh.loops)
+		loop_verts = np.empty(nloops, dtype=np.int32)
+		mesh.loops.foreach_get("vertex_index", loop_verts)
+
+		normals = corner_normals(mesh)
+		uvs = np.zeros((nloops, 2), dtype=np.float32)
+		if mesh.uv_layers.active is not None:
+			mesh.uv_layers.active.data.foreach_get("uv", uvs.ravel())
+
+	with timer.phase("UV split"):
+		# One s3o vertex per distinct (vertex, UV, normal) key, in order of first use
+		keys = loop_verts[:, None].astype(np.int64)
+		if SPLIT_UVS:
+			keys = np.hstack((
+				keys,
+				np.round(uvs / UV_QUANTUM).astype(np.int64),
+				np.round(normals / NORMAL_QUANTUM).astype(np.int64)))
+		# Rows are compared as raw bytes, which is much faster than axis=0
+		keys = np.ascontiguousarray(keys[tri_loops])
+		keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+		_, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+		order = np.argsort(first, kind="stable")
+		rank = np.empty_like(order)
+		rank[order] = np.arange(len(order))
+		first_loops = tri_loops[first[order]]
+
+		verts = np.empty((len(first_loops), 8), dtype=np.float32)
+		verts[:, 0:3] = co[loop_verts[first_loops]]
+		verts[:, 3:6] = normals[first_loops]
+		verts[:, 6:8] = uvs[first_loops]
+		polygons = rank[inverse.ravel()].astype(np.uint32).reshape(-1, width)
+	timer.count("extraction", loops=nloops)
+	timer.count("UV split", verts=nverts, split_verts=len(verts))
+
+	return s3o_codec.swap_axes(verts), polygons
+
+
+def export_mesh(obj, depsgraph, use_mesh_modifiers=False, use_triangles=False,
+                use_remove_base_plate=False, timer=None):
+	"""Temporary copy of the mesh of an object, ready to be exported.
+
+	The rotation and scale of the object (and its parents) are baked into the
+	copy, which is also triangulated and stripped from its base plate if
+	requested. The object and its mesh are never modified.
+
+	Parameters
+	==========
+	obj : bpy.types.Object
+		The (original) mesh object
+	depsgraph : bpy.types.Depsgraph
+		The evaluated dependency graph, used to apply the modifiers
+	use_mesh_modifiers : bool
+		Export the mesh with its modifiers applied
+	use_triangles : bool
+		Triangulate the quads and n-gons with the BEAUTY method
+	use_remove_base_plate : bool
+		Remove the base plate (see remove_base_plate())
+	timer : s3o_codec.phase_timer
+		Collects the time spent in each phase
+
+	Returns
+	=======
+	owner : bpy.types.Object
+		The object owning the copy, call owner.to_mesh_clear() when done
+	mesh : bpy.types.Mesh
+		The temporary mesh
+	"""
+	if timer is None:
+		timer = s3o_codec.phase_timer()
+	with timer.phase("modifier apply" if use_mesh_modifiers else "mesh copy", objects=1):
+		owner = obj.evaluated_get(depsgraph) if use_mesh_modifiers else obj
+		mesh = owner.to_mesh()
+	matrix = obj.matrix_world.to_3x3().to_4x4()
+
+	with timer.phase("transform"):
+		bm = bmesh.new()
+		bm.from_mesh(mesh)
+		bmesh.ops.transform(bm, matrix=matrix, verts=bm.verts)
+		if matrix.is_negative:
+			# Mirrored, keep the faces pointing outwards
+			bmesh.ops.reverse_faces(bm, faces=bm.faces)
+		bm.normal_update()
+	timer.count("transform", verts=len(bm.verts))
+	if use_triangles:
+		with timer.phase("triangulate", faces=len(bm.faces)):
+			bmesh.ops.triangulate(bm, faces=bm.faces[:], quad_method='BEAUTY', ngon_method='BEAUTY')
+	with timer.phase("transform"):
+		bm.to_mesh(mesh)
+	if use_remove_base_plate:
+		# The faces of the mesh are in the bmesh order, so its normals can be
+		# fetched at once. The mesh is only written again if a plate is found
+		with timer.phase("base plate", faces=len(bm.faces)):
+			if remove_base_plate(bm, face_normals(mesh)):
+				bm.to_mesh(mesh)
+	bm.free()
+	return owner, mesh
+
+
+def geometry_key(obj, use_mesh_modifiers=False):
+	"""Key telling apart the objects whose exported geometry may differ.
+
+	Objects sharing their mesh data and the rotation and scale of their world
+	matrix export the same geometry, unless their modifiers are applied.
+	"""
+	matrix = tuple(tuple(row) for row in obj.matrix_world.to_3x3())
+	owner = obj.as_pointer() if use_mesh_modifiers and len(obj.modifiers) else None
+	return (obj.data.as_pointer(), matrix, owner)
+
+
+def ProcessPiece(piece, depsgraph, use_mesh_modifiers=False, use_triangles=False,
+                 use_remove_base_plate=False, use_quads=False, timer=None,
+                 cache=None):  # Empty or Mesh, will recurse through children
+	"""Fill the offsets and geometry of a piece and its children from their
+	objects. If a cache dict is given, the geometry of the meshes is stored
+	there, and reused for the objects with the same geometry_key()"""
+	if timer is None:
+		timer = s3o_codec.phase_timer()
 	obj = piece.mesh
 
 	if obj.type == 'EMPTY' or obj.type == 'MESH':  # or: in {'MESH'} etc
-		### Apply scale/rotation
-		apply_transform(obj, use_location=False, use_rotation=True, use_scale=True)
-			#obj.data.transform(obj.matrix_world)
-			#obj.data.update()
-			#matrix = Matrix.Identity(4)
-			#obj.matrix_world = matrix
-			#objLoc = obj.matrix_world @ obj.location
-		localPos = obj.matrix_local #local x = [0][3], y = [1][3], z = [2][3]
-		piece.xoffset = -localPos[0][3] # -obj.location[0] #objLoc[0]
-		piece.yoffset = localPos[2][3] # obj.location[2] #objLoc[1]
-		piece.zoffset = localPos[1][3] # obj.location[1] #objLoc[2]
+		# The rotation and scale of the whole hierarchy are baked into the
+		# exported geometry, so the offsets are just world space translations
+		offset = obj.matrix_world.translation
+		if obj.parent is not None:
+			offset = offset - obj.parent.matrix_world.translation
+		piece.xoffset = -offset[0]
+		piece.yoffset = offset[2]
+		piece.zoffset = offset[1]
 
 	#########################################
 	# For 3D meshes, export the geometry
 	#########################################
 	if obj.type == 'MESH':
-		obj.select_set(state=True)
-		bpy.context.view_layer.objects.active = obj
-
-		mesh = obj.data
-		mesh.update()
-
-		# Split polygons by UV islands (to prevent the shared/synced UVs issue in S3Os)
-		# From: https://blender.stackexchange.com/questions/73647/python-bmesh-for-loop-breaking-trying-to-split-mesh-via-uv-islands
-		if SPLIT_UVS and len(obj.data.uv_layers):
-			# bpy.ops.object.mode_set(mode='EDIT')
-			# bm = bmesh.from_edit_mesh(mesh)
-			# bm.select_mode = {'FACE'}
-			# faceGroups = []
-			# bpy.ops.mesh.select_mode(use_extend=False, use_expand=False, type='FACE')
-			# save_sync = scene.tool_settings.use_uv_select_sync
-			# scene.tool_settings.use_uv_select_sync = True
-			# faces = set(bm.faces[:])
-			# while faces:
-			# 	bpy.ops.mesh.select_all(action='DESELECT')
-			# 	face = faces.pop()
-			# 	face.select = True
-				
-			# 	bpy.ops.uv.select_linked()
-
-			# 	selected_faces = {f for f in faces if f.select}
-			# 	selected_faces.add(face)  # this or bm.faces above?
-			# 	faceGroups.append(selected_faces)
-			# 	faces -= selected_faces
-			# 	scene.tool_settings.use_uv_select_sync = save_sync
-			# 	for g in faceGroups:
-			# 		bpy.ops.mesh.select_all(action='DESELECT')
-			# 		for f in g:
-			# 			f.select = True
-			# 		bpy.ops.mesh.split()
-
-			# mesh.update()
-			# bpy.ops.object.mode_set(mode='OBJECT')
-
-			#### Optional algorithm, experiments only
+		key = geometry_key(obj, use_mesh_modifiers) if cache is not None else None
+		if key is not None and key in cache:
+			piece.verts, piece.polygons = cache[key]
+			timer.count("shared meshes", objects=1)
+			print("Shared " + str(len(piece.verts)) + " verts")
+		else:
+			owner, mesh = export_mesh(obj, depsgraph, use_mesh_modifiers,
+			                          use_triangles, use_remove_base_plate, timer)
 			try:
-				bpy.ops.object.mode_set(mode='EDIT')
-				bm = bmesh.from_edit_mesh(mesh)
-				# old seams
-				old_seams = [e for e in bm.edges if e.seam]
-				# unmark
-				for e in old_seams:
-					e.seam = False
-				# mark seams from uv islands
-				bpy.ops.mesh.select_all(action='SELECT')  # NEW LINE!!!
-				bpy.ops.uv.select_all(action='SELECT')   # NEW LINE!!!
-				bpy.ops.uv.seams_from_islands()
-				seams = [e for e in bm.edges if e.seam]
-				# split on seams
-				bmesh.ops.split_edges(bm, edges=seams)
-				# re instate old seams.. could clear new seams.
-				for e in old_seams:
-					e.seam = True
-				bmesh.update_edit_mesh(mesh)
-				bpy.ops.object.mode_set(mode='OBJECT')
-			except RuntimeError:
-				# Happens on: bpy.ops.uv.select_all(action='SELECT'), not sure why.
-				pass
-
-			mesh.calc_loop_triangles()
-			uv_layer = mesh.uv_layers.active.data
-
-			#print ("offsets: "+str(piece.xoffset)+", "+str(piece.yoffset)+", "+str(piece.zoffset))
-			#objLoc = obj.matrix_world.decompose()  # obj.matrix_world @ obj.location
-			#print ("objLoc: "+str(objLoc[0][0])+", "+str(objLoc[1][0])+", "+str(objLoc[2][0]))
-			for v in mesh.vertices:
-				#v_co = mathutils.Vector((v.co.x + objLoc[0][0], v.co.y + objLoc[2][0], v.co.z + objLoc[1][0]))
-				#v_co = obj.matrix_world @ v_co      # apply world rotation to vertex pos
-				vert = s3o_vert()
-				vert.xpos = -v.co.x # v_co.x # + objLoc[0][0]
-				vert.ypos = v.co.z # v_co.y # + objLoc[1][0]
-				vert.zpos = v.co.y # v_co.z # + objLoc[2][0] # piece.zoffset
-				vert.xnormal = -v.normal.x
-				vert.ynormal = v.normal.z
-				vert.znormal = v.normal.y
-				piece.verts.append(vert)
+				# Split the vertices along the UV islands and sharp edges (to prevent
+				# the shared/synced UVs issue in S3Os), without touching the mesh
+				piece.verts, piece.polygons = extract_geometry(mesh, use_quads, timer)
+			finally:
+				owner.to_mesh_clear()
+			if key is not None:
+				cache[key] = (piece.verts, piece.polygons)
 			print("Exported " + str(len(piece.verts)) + " verts")
-			# # Merge Back (that'd be only for poly export really)
-			# bpy.ops.object.mode_set(mode='EDIT')
-			# bpy.ops.mesh.select_all(action='SELECT')
-			# bpy.ops.mesh.remove_doubles(threshold=0.05)  # merge_threshold
-			# bpy.ops.object.mode_set(mode='OBJECT')
-			for tri in mesh.loop_triangles:     # polygons
-				faceIndices = []
-				for loop_index in tri.loops:     # loop_indices # range(poly.loop_start, poly.loop_start + poly.loop_total):
-					loop = mesh.loops[loop_index]
-					vIndex = loop.vertex_index
-					faceIndices.append(vIndex)
-					# get uvs
-					piece.verts[vIndex].texu = uv_layer[loop_index].uv.x  # poly.uv[i].x
-					piece.verts[vIndex].texv = uv_layer[loop_index].uv.y  # poly.uv[i].y
-				piece.polygons.append(faceIndices)
-			piece.numVerts = len(piece.verts)
-			piece.vertTableSize = len(piece.polygons)
+		piece.numVerts = len(piece.verts)
+		piece.vertTableSize = len(piece.polygons)
 
 	# Recurse through children |=> piece.children[idx] = [piece,...]
 	for idx, childPiece in enumerate(piece.children):
-		piece.children[idx] = ProcessPiece(childPiece, scene)
+		piece.children[idx] = ProcessPiece(childPiece, depsgraph, use_mesh_modifiers,
+		                                   use_triangles, use_remove_base_plate, use_quads,
+		                                   timer, cache)
 
 	return piece
 
 
-def apply_modifiers(obj):
-	ctx = bpy.context.copy()
-	ctx['object'] = obj
-	for _, m in enumerate(obj.modifiers):
-		try:
-			ctx['modifier'] = m
-			bpy.ops.object.modifier_apply(ctx, modifier=m.name)
-		except RuntimeError:
-			print(f"Error applying {m.name} to {obj.name}, removing it instead.")
-			obj.modifiers.remove(m)
-
-	for m in obj.modifiers:
-		obj.modifiers.remove(m)
+def remove_base_plate(mesh, normals):
+	"""Remove the base plate, i.e. a horizontal, downwards facing square quad
+	(or pair of adjacent triangles), from a bmesh.
 
-def remove_base_plate(obj, z_threshold):
-	if obj.type != 'MESH':
-		return
-
-	def are_triangles_adjacent(tri1, tri2):
-		try:
-			common_verts = set(tri1.verts) & set(tri2.verts)
-		except ReferenceError:
-			return False
-
-		return len(common_verts) == 2
-
-	def is_horizontal_face(face):
-		# Check if the angle is within the specified threshold
-		return 0 <= math.degrees(face.normal.angle((0, 0, -1))) <= 10.0
-
-	obj.select_set(state=True)
-	bpy.context.view_layer.objects.active = obj
-	bpy.ops.object.mode_set(mode='EDIT')
-	mesh = bmesh.from_edit_mesh(obj.data)
-
-	# Iterate through all faces in the BMesh
-	for face1 in mesh.faces:
+	The horizontal faces are selected at once from the (F, 3) array of face
+	normals (see face_normals()), and only those are then visited, pairing
+	the triangles through their edges. Returns whether a plate was removed.
+	"""
+	faces = mesh.faces
+	if not len(faces):
+		return False
+	faces.ensure_lookup_table()
+	faces.index_update()
+
+	# Faces within 10 degrees of pointing downwards
+	normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+	lengths = np.linalg.norm(normals, axis=1)
+	horizontal = (lengths > 0) & (-normals[:, 2] >= math.cos(radians(10.0)) * lengths)
+
+	def is_square(face):
+		lengths = [e.calc_length() for e in face.edges]
+		return all(abs(l.calc_angle() - radians(90)) < 1E-3 for l in face.loops) and \
+			max(lengths) - min(lengths) < 1E-3 * max(lengths)
+
+	for i in np.flatnonzero(horizontal):
+		face1 = faces[i]
 		if len(face1.verts) == 4: # GL_QUADS - should never come here
-			angles = [v.co.angle(face1.calc_center_median() - v.co, use_sign=True) for v in face1.verts]
-			if all(abs(angle) == radians(45) for angle in angles):
-				if is_horizontal_face(face1):
-					bmesh.ops.delete(mesh, geom=[face1], context='FACES')
-					return
+			if is_square(face1):
+				bmesh.ops.delete(mesh, geom=[face1], context='FACES')
+				return True
 
-		# Check if the face1 is a triangle
+		# Look for a horizontal triangle sharing an edge with this one
 		if len(face1.verts) == 3: # GL_TRIANGLES
-			if not is_horizontal_face(face1):
-				continue
-
-			for face2 in mesh.faces:
-				# Check if the face2 is a triangle and shares two vertices with face1
-				if is_horizontal_face(face2) and are_triangles_adjacent(face1, face2):
-					bmesh.ops.delete(mesh, geom=[face1, face2], context='FACES')
-					return
-
-	bmesh.update_edit_mesh(obj.data)
-	bpy.ops.object.mode_set(mode='OBJECT')
+			for edge in face1.edges:
+				for face2 in edge.link_faces:
+					if face2 != face1 and horizontal[face2.index] and \
+							len(face2.verts) == 3:
+						bmesh.ops.delete(mesh, geom=[face1, face2], context='FACES')
+						return True
+	return False
+
+
+def finish_pieces(model, remove_suffix=True, use_vertex_cache=False, use_weld=True,
+                  use_compact_primitives=False, timer=None, done=None):
+	"""Weld, reorder and encode the geometry of all the pieces of a model.
+
+	If a done dict is given, the results are stored there, keyed by the
+	geometry arrays they come from, and reused for the pieces sharing those
+	arrays (see ProcessPiece())
+	"""
+	if timer is None:
+		timer = s3o_codec.phase_timer()
+	misses_before = misses_after = num_tris = 0
+	for p in model.pieces():
+		print("saving piece [" + p.name + "] with " + str(len(p.children)) + " children")
+		if remove_suffix:
+			p.name = strip_suffix(p.name)
+		source = (p.verts, p.polygons)
+		key = (id(p.verts), id(p.polygons))
+		if done is not None and key in done:
+			p.verts, p.polygons = done[key][1]
+		else:
+			if use_weld and len(p.verts):
+				# Identical (position, normal, UV) vertices, and unused ones
+				num_verts = len(p.verts)
+				with timer.phase("weld"):
+					p.verts, p.polygons = s3o_codec.weld_vertices(p.verts, p.polygons)
+				timer.count("weld", verts=num_verts, welded_verts=len(p.verts))
+				print("\tVertices: " + str(num_verts) + " -> " + str(len(p.verts)))
+			if use_vertex_cache and len(p.polygons) and p.polygons.shape[1] == 3:
+				# Triangles ordered for the GPU vertex cache, vertices by first use
+				with timer.phase("vertex cache", tris=len(p.polygons)):
+					before = s3o_codec.acmr(p.polygons)
+					p.polygons = s3o_codec.optimize_vertex_cache(p.polygons, len(p.verts))
+					p.verts, p.polygons = s3o_codec.reorder_vertices(p.verts, p.polygons)
+					after = s3o_codec.acmr(p.polygons)
+				print("\tACMR: %.3f -> %.3f" % (before, after))
+				misses_before += before * len(p.polygons)
+				misses_after += after * len(p.polygons)
+				num_tris += len(p.polygons)
+			if done is not None:
+				# The source arrays are kept alive, so their ids aren't reused
+				done[key] = (source, (p.verts, p.polygons))
+		with timer.phase("primitives"):
+			p.set_primitives(use_compact_primitives)
+		timer.count("primitives", indices=len(p.indices))
+	if num_tris:
+		print("Average cache miss ratio: %.3f -> %.3f" % (misses_before / num_tris,
+		                                                  misses_after / num_tris))
 
 
 def save_s3o_file(s3o_filename,
@@ -521,78 +498,22 @@ def save_s3o_file(s3o_filename,
 				  use_triangles=False,
 				  remove_suffix=True,
 				  texture1_name="corota_tex1.dds",  #"texture1.dds",
-				  texture2_name="corota_tex2.dds"   #"texture2.dds"
+				  texture2_name="corota_tex2.dds",  #"texture2.dds"
+				  use_vertex_cache=False,
+				  use_weld=True,
+				  use_compact_primitives=False,
+				  timer=None
 				 ):
+	"""Export the scene (or the selection) to a s3o file
 
-	# # modified from snippet: https://blender.stackexchange.com/questions/223858/how-do-i-get-the-bounding-box-of-all-objects-in-a-scene
-	def estimateSpringRadiusHeight(objects):
-		def bounding_sphere(objs):
-
-			# select all objects in the scene and assign it to the objects variable
-			if objs is None or len(objs) < 1:
-				objs = bpy.context.scene.objects
-
-			print("Amount of objects: " + str(len(objs)))
-
-			# for this_obj in obj:
-			#points_co_global.extend([this_obj.matrix_world @ vertex.co for vertex in this_obj.data.vertices])
-
-			# multiply 3d coord list by matrix
-			def np_matmul_coords(coords, matrix, space=None):
-				M = (space @ matrix @ space.inverted()
-					 if space else matrix).transposed()
-				ones = np.ones((coords.shape[0], 1))
-				coords4d = np.hstack((coords, ones))
-
-				return np.dot(coords4d, M)[:, :-1]
-				return coords4d[:, :-1]
-
-			# get the global coordinates of all object bounding box corners
-			coords = np.vstack(
-				tuple(np_matmul_coords(np.array(o.bound_box), o.matrix_world.copy())
-					  for o in
-					  objs  # context.scene.objects
-					  if o.type == 'MESH'
-					  )
-			)
-			# bottom front left (all the mins)
-			bfl = coords.min(axis=0)
-			# top back right
-			tbr = coords.max(axis=0)
-
-			G = np.array((bfl, tbr)).T
-			# bound box coords ie the 8 combinations of bfl tbr.
-			bbc = [i for i in itertools.product(*G)]
-
-			center = ((bfl[0] + tbr[0]) / 2, (bfl[1] + tbr[1]) / 2, (bfl[2] + tbr[2]) / 2)
-			all_corners = np.array(bbc)
-
-			max_radius = 0
-			for el in all_corners:
-				# print(el)
-				this_radius = math.sqrt(
-					(el[0] - center[0]) ** 2 + (el[1] - center[1]) ** 2 + (el[2] - center[2]) ** 2)
-				if this_radius > max_radius:
-					max_radius = this_radius
-			# print( "BFL: "+str(bfl) )
-			# print( "TBR: "+str(tbr) )
-
-			### Use below just for automatic radius/height estimation debug purposes, within Blender
-			# bpy.ops.object.empty_add(type='SPHERE', location=center, radius=max_radius)
-			# new_empty = bpy.context.object
-			# new_empty.name = "BBoxCenterEmpty"
-
-			return center, max_radius, abs(tbr[2] - bfl[2])  # Top-bottom-right Z axis, minus Bottom-front-left Z axis = height
-
-		# bpy.ops.mesh.select_all(action='SELECT')
-		b_sphere_co, b_sphere_radius, b_sphere_height = bounding_sphere(objs=objects)
-		header.radius = b_sphere_radius  #50
-		header.midx = b_sphere_co[0]
-		header.midy = b_sphere_co[2]	# We need to switch Y & Z, for Upspring/Spring compatible orientation
-		header.midz = b_sphere_co[1]
-
-		header.height = b_sphere_height
-		print("\n\n\tEstimated SpringRadius: "+str(b_sphere_radius)+", SpringHeight: "+str(b_sphere_height)+"\n\n")
+	Returns
+	=======
+	timer : s3o_codec.phase_timer
+		Time spent in each phase of the export, None if it failed. If a timer
+		is provided, the phases are accumulated to it
+	"""
+	if timer is None:
+		timer = s3o_codec.phase_timer()
 
 	######
 	# texture1_name = "texture1.dds"
@@ -604,11 +525,13 @@ def save_s3o_file(s3o_filename,
 		  + ", Remove Suffix: " + str(remove_suffix)
 		  + ", Texture1 Name: " + str(texture1_name)
 		  + ", Texture2 Name: " + str(texture2_name)
+		  + ", Optimize vertex cache: " + str(use_vertex_cache)
+		  + ", Weld vertices: " + str(use_weld)
+		  + ", Compact primitives: " + str(use_compact_primitives)
 	      )
 
-	header = s3o_header()
+	header = s3o_codec.s3o_header()
 
-	scene = context.scene  # Blender.Scene.GetCurrent()
 	selection = context.selected_objects
 
 	# get the texture name to save into the header
@@ -656,32 +579,13 @@ def save_s3o_file(s3o_filename,
 		if obj.type == 'ARMATURE':
 			continue
 
-		if use_mesh_modifiers:
-			apply_modifiers(obj)
-
-		if use_triangles and obj.type == "MESH":
-			mesh = obj.data
-			# First make the target object active, then switch to Edit mode
-			context.view_layer.objects.active = obj
-			bpy.ops.object.mode_set(mode='EDIT')
-			bm = bmesh.from_edit_mesh(mesh)
-			bmesh.ops.triangulate(bm, faces=bm.faces[:], quad_method='BEAUTY', ngon_method='BEAUTY')
-			bmesh.update_edit_mesh(mesh) #, True
-			bpy.ops.object.mode_set(mode='OBJECT')
-
-		if use_remove_base_plate:
-			remove_base_plate(obj, 0.01)
-
 		piece = s3o_piece()
 		#########################################
 		# go through all mesh objects and empties, then convert them to s3o_pieces and set origins (as offsets)
 		#########################################
 		if obj.type == 'EMPTY' or obj.type == 'MESH':  # or: in {'MESH'} etc
-			# TODO: Add undo for each destructive operation
 			piece.mesh = obj  # # Test
 			piece.name = obj.name
-			piece.verts = []
-			piece.polygons = []
 			print("-----------------------------")
 			print("Parsing [" + obj.name + "]")
 			piece.primitiveType = 0
@@ -702,11 +606,6 @@ def save_s3o_file(s3o_filename,
 		if obj.type == 'EMPTY' or obj.type == 'MESH':  # or: in {'MESH'} etc
 			pieces.append(piece)
 
-	# # No longer aborts if these objects weren't found.
-	if not foundRadius or not foundHeight:
-		print("Could not find SpringRadius and/or SpringHeight objects. Estimating Values.")
-		estimateSpringRadiusHeight(selection)
-
 	# # find the piece with no parent (inits with the first one it finds) and sets it as the Root
 	root_piece = None
 	for p in pieces:
@@ -722,35 +621,246 @@ def save_s3o_file(s3o_filename,
 		print("ERROR: No root object found! Aborting")
 		return
 
+	# Do the required geometric manipulations to the hierarchy of pieces
+	# on temporary copies of the meshes, the scene is left untouched
+	depsgraph = context.evaluated_depsgraph_get()
+	root_piece = ProcessPiece(root_piece, depsgraph, use_mesh_modifiers,
+	                          use_triangles, use_remove_base_plate,
+	                          use_compact_primitives, timer)
+
+	model = s3o_codec.s3o_model(header, root_piece)
+
+	# # No longer aborts if these objects weren't found.
+	if not foundRadius or not foundHeight:
+		# Minimal sphere around the exported vertices, in the s3o axes
+		print("Could not find SpringRadius and/or SpringHeight objects. Estimating Values.")
+		with timer.phase("bounds"):
+			center, radius, height = s3o_codec.estimate_bounds(model)
+		if center is not None:
+			if not foundRadius:
+				header.radius = radius
+				header.midx, header.midy, header.midz = center
+			if not foundHeight:
+				header.height = height
+			print("\n\n\tEstimated SpringRadius: "+str(header.radius)+", SpringHeight: "+str(header.height)+"\n\n")
+
+	finish_pieces(model, remove_suffix, use_vertex_cache, use_weld,
+	              use_compact_primitives, timer)
+
+	# The whole file is laid out in memory, then atomically replaces the target
 	try:
-		file = open(s3o_filename, "wb")
-	except IOError:
+		with timer.phase("write"):
+			s3o_codec.dump(model, s3o_filename)
+	except (IOError, OSError):
 		print("ERROR: Cannot open " + s3o_filename + " for writing")
 		return
 
-	# skip forward the size of the header, we'll come back later to write the header
-	file.seek(struct.calcsize(header.binary_format), os.SEEK_CUR)
+	timer.count("write", bytes=os.path.getsize(s3o_filename))
+	return timer
 
-	# Do the required geometric manipulations to the hierarchy of pieces
-	root_piece = ProcessPiece(root_piece, scene)
 
-	header.rootPieceOffset = file.tell()
-	root_piece.save(file, remove_suffix)
+def is_marker(obj):
+	return 'SpringRadius' in obj.name or 'SpringHeight' in obj.name
 
-	# save the texture names and write their offsets in the header
-	if header.texture1:
-		header.texture1Offset = file.tell()
-		file.write(header.texture1.encode() + b'\0')  # #
-	if header.texture2:
-		header.texture2Offset = file.tell()
-		file.write(header.texture2.encode() + b'\0')  # #
 
-	# jump back to the beginning to save the header
-	file.seek(0, os.SEEK_SET)
-	header.save(file)
-	file.close()
+def build_pieces(obj):
+	"""Tree of pieces of an object and its descendants, the EMPTY and MESH
+	ones, leaving out the SpringRadius and SpringHeight markers"""
+	piece = s3o_piece()
+	piece.mesh = obj
+	piece.name = obj.name
+	for child in obj.children:
+		if child.type in {'EMPTY', 'MESH'} and not is_marker(child):
+			child_piece = build_pieces(child)
+			child_piece.parent = piece
+			piece.children.append(child_piece)
+	return piece
 
-	return
+
+def find_markers(header, obj, names=()):
+	"""Read the radius, center and height from the SpringRadius and
+	SpringHeight objects of a root, into header.
+
+	The markers are looked for among the descendants of obj. The missing ones
+	are then taken from the unparented markers, as the importer creates them:
+	preferably the ones named after obj or one of names (e.g.
+	"armaca.SpringRadius" for "armaca"), otherwise any of them, as the single
+	file export does.
+
+	Returns
+	=======
+	foundRadius, foundHeight : bool
+		Whether each marker was found
+	"""
+	markers = {}
+	pending = list(obj.children)
+	while pending:
+		child = pending.pop()
+		pending.extend(child.children)
+		for kind in ('SpringRadius', 'SpringHeight'):
+			if kind in child.name:
+				markers.setdefault(kind, child)
+
+	names = {obj.name, bpy.path.clean_name(obj.name)} | set(names)
+	for marker in bpy.data.objects:
+		if marker.parent is not None:
+			continue
+		for kind in ('SpringRadius', 'SpringHeight'):
+			if kind not in marker.name or kind in markers:
+				continue
+			prefix = marker.name.split(kind)[0].rstrip("._")
+			if prefix in names:
+				markers[kind] = marker
+	for marker in bpy.data.objects:
+		for kind in ('SpringRadius', 'SpringHeight'):
+			if marker.parent is None and kind in marker.name and kind not in markers:
+				markers[kind] = marker
+
+	if 'SpringRadius' in markers:
+		marker = markers['SpringRadius']
+		print("\tSpringRadius from [" + marker.name + "]")
+		header.radius = marker.empty_display_size
+		location = marker.matrix_world.translation
+		header.midx = -location[0]
+		header.midy = location[2]
+		header.midz = location[1]
+	if 'SpringHeight' in markers:
+		marker = markers['SpringHeight']
+		print("\tSpringHeight from [" + marker.name + "]")
+		header.height = marker.matrix_world.translation[2]
+	return 'SpringRadius' in markers, 'SpringHeight' in markers
+
+
+def save_s3o_files(roots,
+                   filenames,
+                   context,
+                   use_mesh_modifiers=False,
+                   use_remove_base_plate=False,
+                   use_triangles=False,
+                   remove_suffix=True,
+                   texture1_name="corota_tex1.dds",
+                   texture2_name="corota_tex2.dds",
+                   use_vertex_cache=False,
+                   use_weld=True,
+                   use_compact_primitives=False,
+                   root_names=None,
+                   texture_names=None,
+                   threads=None,
+                   timer=None,
+                   timers=None
+                  ):
+	"""Export several objects, with their descendants, each to its own file.
+
+	The hierarchies are walked from the roots, regardless of the selection.
+	Objects sharing a mesh (see geometry_key()) are processed just once, even
+	across roots. The files are written from a pool of threads while the
+	next roots are processed. The SpringRadius and SpringHeight markers are
+	looked for among the descendants of each root, the missing ones are
+	estimated from the vertices.
+
+	Parameters
+	==========
+	roots : list of bpy.types.Object
+		The root objects, EMPTY or MESH
+	filenames : list of str
+		The s3o file of each root
+	root_names : list of str
+		Name of the root piece of each file, the root object names if None
+	texture_names : list of tuple
+		(texture1, texture2) names of each file, texture1_name and
+		texture2_name for all of them if None
+	threads : int
+		Number of threads writing the files, None for the Python default
+	timers : list
+		If provided, the time spent on each root is appended to it, in the
+		order of roots, None for the files that could not be written. The
+		meshes shared with a previous root are accounted to that one
+
+	See save_s3o_file() for the other options.
+
+	Returns
+	=======
+	timer : s3o_codec.phase_timer
+		Time spent in each phase of the export, None if any file could not
+		be written. If a timer is provided, the phases are accumulated to it
+	"""
+	if timer is None:
+		timer = s3o_codec.phase_timer()
+	if root_names is None:
+		root_names = [root.name for root in roots]
+	if texture_names is None:
+		texture_names = [(texture1_name, texture2_name)] * len(roots)
+
+	depsgraph = context.evaluated_depsgraph_get()
+	cache, done = {}, {}
+
+	def write(model, s3o_filename):
+		# Runs in the pool, so the shared timer is not touched here
+		start = time.perf_counter()
+		s3o_codec.dump(model, s3o_filename)
+		return time.perf_counter() - start
+
+	failed = False
+	with ThreadPoolExecutor(max_workers=threads) as executor:
+		writes = []
+		for root, s3o_filename, root_name, (texture1, texture2) in zip(
+				roots, filenames, root_names, texture_names):
+			print("-----------------------------")
+			print("Exporting [" + root.name + "] to " + s3o_filename)
+			root_timer = s3o_codec.phase_timer()
+			header = s3o_codec.s3o_header()
+			header.texture1 = texture1
+			header.texture2 = texture2
+			header.radius = 50
+			foundRadius, foundHeight = find_markers(
+				header, root,
+				(root_name, os.path.splitext(os.path.basename(s3o_filename))[0]))
+
+			root_piece = build_pieces(root)
+			root_piece = ProcessPiece(root_piece, depsgraph, use_mesh_modifiers,
+			                          use_triangles, use_remove_base_plate,
+			                          use_compact_primitives, root_timer, cache)
+			root_piece.name = root_name
+			model = s3o_codec.s3o_model(header, root_piece)
+
+			if not foundRadius or not foundHeight:
+				with root_timer.phase("bounds"):
+					center, radius, height = s3o_codec.estimate_bounds(model)
+				if center is not None:
+					if not foundRadius:
+						header.radius = radius
+						header.midx, header.midy, header.midz = center
+					if not foundHeight:
+						header.height = height
+				if not foundRadius:
+					print("\tNo SpringRadius object for [" + root.name +
+					      "], estimated: " + str(header.radius))
+				if not foundHeight:
+					print("\tNo SpringHeight object for [" + root.name +
+					      "], estimated: " + str(header.height))
+
+			finish_pieces(model, remove_suffix, use_vertex_cache, use_weld,
+			              use_compact_primitives, root_timer, done)
+			writes.append((s3o_filename, root_timer,
+			               executor.submit(write, model, s3o_filename)))
+
+		for s3o_filename, root_timer, future in writes:
+			try:
+				seconds = future.result()
+			except (IOError, OSError):
+				print("ERROR: Cannot open " + s3o_filename + " for writing")
+				failed = True
+				root_timer = None
+			else:
+				root_timer.count("write", seconds=seconds, files=1,
+				                 bytes=os.path.getsize(s3o_filename))
+			if timers is not None:
+				timers.append(root_timer)
+			if root_timer is not None:
+				for name, record in root_timer.phases.items():
+					timer.count(name, **record)
+
+	return None if failed else timer
 
 #@orientation_helper(axis_forward='Z', axis_up='Y') - not needed, we only export Y-up, Z-forward
 class ExportS3O(bpy.types.Operator, ExportHelper):
@@ -797,6 +907,30 @@ class ExportS3O(bpy.types.Operator, ExportHelper):
 		default=True
 	)
 
+	use_weld: BoolProperty(
+		name="Weld vertices",
+		description="Merge the vertices with the same position, normal and UV, and drop the unused ones",
+		default=True
+	)
+
+	use_compact_primitives: BoolProperty(
+		name="Compact primitives",
+		description="Write quads (from all-quads meshes) or triangle strips when they need fewer indices than triangles",
+		default=False
+	)
+
+	use_vertex_cache: BoolProperty(
+		name="Optimize vertex cache",
+		description="Reorder triangles and vertices for the GPU vertex cache (slower export)",
+		default=False
+	)
+
+	use_batch: BoolProperty(
+		name="One file per root",
+		description="Export every root object (or selected root object) with its children to its own file, named after it, in the chosen folder",
+		default=False
+	)
+
 	texture1_name: StringProperty(
 		default="texture1.dds",
 		options={"TEXTEDIT_UPDATE"},
@@ -842,7 +976,7 @@ class ExportS3O(bpy.types.Operator, ExportHelper):
 		if my_obj is None:
 			raise Exception("No object found")
 
-		if my_obj is not None:
+		if not self.use_batch:
 			if self.texture1_name == "texture1.dds" and "s3o_texture1" in my_obj:
 				self.texture1_name = my_obj["s3o_texture1"]
 			if self.texture2_name == "texture2.dds" and "s3o_texture2" in my_obj:
@@ -857,27 +991,71 @@ class ExportS3O(bpy.types.Operator, ExportHelper):
 		if not self.use_selection:
 			bpy.ops.object.select_all(action="DESELECT")
 
-		# # ====== Actually export the s3o file
-		save_s3o_file( self.filepath,
-					context,
-					self.use_selection,
-					self.use_mesh_modifiers,
-					self.use_remove_base_plate,
-					self.use_triangles,
-					self.remove_suffix,
-					self.texture1_name,
-					self.texture2_name
-					)
-
-		bpy.ops.object.select_all(action="DESELECT")
-
-		if my_obj is not None:
+		# # ====== Actually export the s3o file(s)
+		if self.use_batch:
+			roots = [obj for obj in bpy.data.objects
+			         if obj.parent is None and obj.type in {'EMPTY', 'MESH'} and
+			         not is_marker(obj) and (obj.select_get() or not self.use_selection)]
+			folder = os.path.dirname(self.filepath)
+			filenames = [os.path.join(folder, bpy.path.clean_name(obj.name) + ".s3o")
+			             for obj in roots]
+			# Each root keeps its own texture names, as in the single file export
+			texture_names = []
+			for obj in roots:
+				texture1, texture2 = self.texture1_name, self.texture2_name
+				if texture1 == "texture1.dds" and "s3o_texture1" in obj:
+					texture1 = obj["s3o_texture1"]
+				if texture2 == "texture2.dds" and "s3o_texture2" in obj:
+					texture2 = obj["s3o_texture2"]
+				texture_names.append((texture1, texture2))
+			timers = []
+			timer = save_s3o_files(roots, filenames, context,
+			                       self.use_mesh_modifiers,
+			                       self.use_remove_base_plate,
+			                       self.use_triangles,
+			                       self.remove_suffix,
+			                       self.texture1_name,
+			                       self.texture2_name,
+			                       self.use_vertex_cache,
+			                       self.use_weld,
+			                       self.use_compact_primitives,
+			                       texture_names=texture_names,
+			                       timers=timers)
+			for obj, (texture1, texture2) in zip(roots, texture_names):
+				obj["s3o_texture1"] = texture1
+				obj["s3o_texture2"] = texture2
+			outputs = list(zip(filenames, timers))
+		else:
+			timer = save_s3o_file( self.filepath,
+						context,
+						self.use_selection,
+						self.use_mesh_modifiers,
+						self.use_remove_base_plate,
+						self.use_triangles,
+						self.remove_suffix,
+						self.texture1_name,
+						self.texture2_name,
+						self.use_vertex_cache,
+						self.use_weld,
+						self.use_compact_primitives
+						)
 			my_obj["s3o_texture1"] = self.texture1_name
 			my_obj["s3o_texture2"] = self.texture2_name
+			outputs = [(self.filepath, timer)]
+
+		bpy.ops.object.select_all(action="DESELECT")
 
 		print("\n######################")
 		print("Ding! Export Complete in %s seconds" % (time.time() - start_time))
 		print("######################\n\n")
+		for filename, file_timer in outputs:
+			if file_timer is not None:
+				file_timer.dump(file=filename, operation="export")
+		failed = [filename for filename, file_timer in outputs if file_timer is None]
+		if failed:
+			self.report({"ERROR"}, "Could not export " + ", ".join(failed))
+			return {"CANCELLED"}
+		self.report({"INFO"}, "Exported in %.3f s: %s" % (time.time() - start_time, timer.summary()))
 		return {"FINISHED"}
 
 	def invoke(self, context, event):
@@ -1,12 +1,13 @@
 #!BPY
 import bpy
-import bmesh
-from mathutils import Vector
 # ImportHelper is a helper class, defines filename and invoke() function which calls the file selector
 from bpy_extras.io_utils import ImportHelper
 
 import os
-import struct
+
+import numpy as np
+
+import s3o_codec
 
 
 # This program is free software: you can redistribute it and/or modify
@@ -42,16 +43,6 @@ except AttributeError:
     os.SEEK_SET, os.SEEK_CUR, os.SEEK_END = range(3)
 
 
-def read_string(fhandle, offset):
-    fhandle.seek(offset, os.SEEK_SET)
-    string = ''
-    c = fhandle.read(1)
-    while(c != b'' and c != b'\x00'):
-        string += c.decode('ascii')
-        c = fhandle.read(1)
-    return string
-
-
 def folder_root(folder, name):
     """Case insensitive recursive folder root extraction.
 
@@ -87,6 +78,45 @@ def folder_root(folder, name):
     return folder[:index]
 
 
+# Lowercase file name indexes of the folders searched by find_in_folder,
+# shared by all the imports of the Blender session:
+# {folder: (mtime, {lowercase name: name})}
+_folder_indexes = {}
+
+
+def folder_index(folder):
+    """Case insensitive index of the folder contents
+
+    The index is built once, and rebuilt only when the folder modification
+    time changes (i.e. when files are added, removed or renamed).
+
+    Parameters
+    ==========
+
+    folder : string
+        Folder to be indexed
+
+    Returns
+    =======
+
+    index : dict
+        Lowercase file/folder names to actual names. It is empty if the folder
+        cannot be read.
+    """
+    try:
+        mtime = os.stat(folder).st_mtime_ns
+    except OSError:
+        return {}
+    cached = _folder_indexes.get(folder)
+    if cached is None or cached[0] != mtime:
+        index = {}
+        for filename in os.listdir(folder):
+            index.setdefault(filename.lower(), filename)
+        cached = (mtime, index)
+        _folder_indexes[folder] = cached
+    return cached[1]
+
+
 def find_in_folder(folder, name):
     """Case insensitive file/folder search tool
     
@@ -104,241 +134,167 @@ def find_in_folder(folder, name):
     filename : string
         The file name (case sensitive), None if the file cannot be found.
     """
-    for filename in os.listdir(folder):
-        if filename.lower() == name.lower():
-            return filename
-    return None
-
-
-class s3o_header(object):
-    binary_format = "<12sI5f4I"
-
-    magic = 'Spring unit'  # char [12] "Spring unit\0"
-    version = 0    # uint = 0
-    radius = 0.0 # float: radius of collision sphere
-    height = 0.0 # float: height of whole object
-    midx = 0.0 # float offset from origin
-    midy = 0.0 #
-    midz = 0.0 #
-    rootPieceOffset = 0 # offset of root piece
-    collisionDataOffset = 0 # offset of collision data, 0 = no data
-    texture1Offset = 0 # offset to filename of 1st texture
-    texture2Offset = 0 # offset to filename of 2nd texture
-
-    def load(self, fhandle):
-        tmp_data = fhandle.read(struct.calcsize(self.binary_format))
-        data = struct.unpack(self.binary_format, tmp_data)
-        self.magic = data[0].decode('ascii').replace('\x00', '').strip()
-        if(self.magic != 'Spring unit'):
-            raise IOError("Not a Spring unit file: '" + self.magic + "'")
-            return
-        self.version = data[1]
-        if(self.version != 0):
-            raise ValueError('Wrong file version: ' + self.version)
-            return
-        self.radius = data[2]
-        self.height = data[3]
-        self.midx = -data[4]
-        self.midy = data[5]
-        self.midz = data[6]
-        self.rootPieceOffset = data[7]
-        self.collisionDataOffset = data[8]
-
-        self.texture1Offset = data[9]
-        if(self.texture1Offset == 0):
-            self.texture1 = ''
-        else:
-            self.texture1 = read_string(fhandle, self.texture1Offset)
+    return folder_index(folder).get(name.lower())
 
-        self.texture2Offset = data[10]
-        if(self.texture2Offset == 0):
-            self.texture2 = ''
-        else:
-            self.texture2 = read_string(fhandle, self.texture2Offset)
-        return
 
+def textures_folder(objdir):
+    """Folder where the textures of the models in objdir are looked for
 
-def remove_doubles(verts):
-    """I would say (J.L. Cercos-Pita aka SanguinarioJoe) this is an upspring
-    fault. Anyway, it is happening that the imported models have duplicated
-    vertices, i.e. vertices that are in the same exact position, and have the
-    same exact normal. It should be noticed that for the sake of the mesh
-    representation, those vertices can be merged.
-    Unfortunatelly, Blender is not dealing ok with such inconsistent mesh, so it
-    is correcting the normals after a wide variety of operations, like entering
-    in edit mode, or exporting the mesh.
-    Thus, this method is checking and merging the vertexes with the same
-    position AND NORMAL. It is also returning a dictionary to translate the
-    original vertice indexes onto the new ones
+    That is the unittextures folder next to the objects3d one, or objdir
+    itself if the model is not inside an objects3d folder.
     """
-    def find_vert(verts, vert):
-        def equal(a, b, tol=1E-6):
-            return abs(a - b) < tol
-        def equal_verts(a, b):
-            return equal(a.xpos, b.xpos) and \
-                   equal(a.ypos, b.ypos) and \
-                   equal(a.zpos, b.zpos) and \
-                   equal(a.xnormal, b.xnormal) and \
-                   equal(a.ynormal, b.ynormal) and \
-                   equal(a.znormal, b.znormal)
-        for i, v in enumerate(verts):
-            if equal_verts(v, vert):
-                return i
-        return None
+    rootdir = folder_root(objdir, "objects3d")
+    if rootdir is None:
+        return objdir
+    texsdir = find_in_folder(rootdir, 'unittextures')
+    if texsdir is None:
+        return objdir
+    return os.path.join(rootdir, texsdir)
 
-    new_verts = []
-    indexes = list(range(len(verts)))
-    for i,v in enumerate(verts):
-        j = find_vert(new_verts, v)
-        if j is None:
-            indexes[i] = len(new_verts)
-            new_verts.append(v)
-        else:
-            indexes[i] = j
 
-    return new_verts, indexes
+def link_object(ob):
+    """Link a new object to the active collection, and select it"""
+    try:
+        #collection = bpy.data.collections.new(self.name)
+        collection = bpy.context.view_layer.active_layer_collection.collection
+        #bpy.context.scene.collection.children.link(collection)
+        collection.objects.link(ob)
+    except AttributeError:
+        # Blender < 2.80
+        bpy.context.scene.objects.link(ob)
+    try:
+        bpy.context.scene.update()
+    except AttributeError:
+        # Blender > 2.80
+        # The scene doesn't seem to need specifically updating in the latest 2.80
+        pass
+    try:
+        ob.select_set(True)
+    except AttributeError:
+        # Blender < 2.80
+        bpy.context.scene.objects.active = ob
+
 
-class s3o_piece(object):
-    binary_format = "<10I3f"
+def new_empty(name, display_type, display_size=1.0, location=(0, 0, 0)):
+    """Create an empty object straight from the data API
 
+    Unlike bpy.ops.object.empty_add, it does not need a valid context, nor
+    triggers an undo push or a depsgraph update per object.
+
+    Parameters
+    ==========
+
+    name : string
+        Object name
+    display_type : string
+        Empty display type, like "PLAIN_AXES", "ARROWS" or "SPHERE"
+    display_size : float
+        Empty display size
+    location : tuple
+        Object location
+
+    Returns
+    =======
+
+    ob : bpy.types.Object
+        The new empty, linked to the active collection
+    """
+    ob = bpy.data.objects.new(name, None)
+    try:
+        ob.empty_display_type = display_type
+        ob.empty_display_size = display_size
+    except AttributeError:
+        # Blender < 2.80
+        ob.empty_draw_type = display_type
+        ob.empty_draw_size = display_size
+    ob.location = location
+    link_object(ob)
+    return ob
+
+
+class s3o_piece(object):
     name = ''
     verts = []
     faces = []
     parent = '' 
     children = []
 
-    nameOffset = 0 # uint
-    numChildren = 0 # uint
-    childrenOffset = 0 # uint
-    numVerts = 0 # uint
-    vertsOffset = 0 # uint
-    vertType = 0 # uint
-    primitiveType = 0 # 0 = tri, 1 = tristrips, 2 = quads
-    vertTableSize = 0 # number of indexes in vert table
-    vertTableOffset = 0
-    collisionDataOffset = 0
+    numVerts = 0
     xoffset = 0.0
     yoffset = 0.0
     zoffset = 0.0
 
-    def load(self, fhandle, offset, material, tex1 : str = "", tex2 : str = ""):
-        fhandle.seek(offset, os.SEEK_SET)
-        tmp_data = fhandle.read(struct.calcsize(self.binary_format))
-        data = struct.unpack(self.binary_format, tmp_data)
-
-        self.nameOffset = data[0]
-        self.numChildren = data[1]
-        self.childrenOffset = data[2]
-        self.numVerts = data[3]
-        self.vertsOffset = data[4]
-        self.vertType = data[5]
-        self.primitiveType = data[6]
-        self.vertTableSize = data[7]
-        self.vertTableOffset = data[8]
-        self.collisionDataOffset = data[9]
-        self.xoffset = -1*data[10]
-        self.yoffset = data[12]
-        self.zoffset = data[11]
-
-        # load self
-        # get name
-        fhandle.seek(self.nameOffset, os.SEEK_SET)
-        self.name = read_string(fhandle, self.nameOffset)
-
-        # load verts
-        self.verts = []
-        for i in range(0, self.numVerts):
-            vert = s3o_vert()
-            vert.load(fhandle, self.vertsOffset + (i * struct.calcsize(vert.binary_format)))
-            self.verts.append(vert)
-        # We want to keep the original vertices because of the UVs information
-        self.unique_verts, self.vertids = remove_doubles(self.verts)
-
-        # load primitives
-        fhandle.seek(self.vertTableOffset, os.SEEK_SET)
-        self.faces = []
-        if(self.primitiveType == 0): # triangles
-            i = 0
-            while(i < self.vertTableSize):
-                tmp = fhandle.read(4 * 3)
-                data = struct.unpack("<3I", tmp)
-                face = [ int(data[0]), int(data[1]), int(data[2]) ]
-                self.faces.append(face)
-                i += 3
-        elif(self.primitiveType == 1): # tristrips
-            raise TypeError('Tristrips are unsupported so far')
-        elif(self.primitiveType == 2): # quads
-            i = 0
-            while(i < self.vertTableSize):
-                tmp = fhandle.read(4 * 4)
-                data = struct.unpack("<4I", tmp)
-                face = [ int(data[0]), int(data[1]), int(data[2]), int(data[3]) ]
-                self.faces.append(face)
-                i += 4
-        else:
-            raise TypeError('Unknown primitive type: ' + self.primitiveType)
+    def load(self, piece, material, tex1 : str = "", tex2 : str = "",
+             timer=None):
+        """Create the Blender object of a piece
+
+        The parent, if any, should be already loaded. The children are not
+        loaded, see load_s3o_file
+
+        Parameters
+        ==========
+
+        piece : s3o_codec.s3o_piece
+            Loaded piece. Its geometry may be already prepared, see
+            s3o_codec.preparse()
+        material : bpy.types.Material
+            Material assigned to the meshes
+        tex1, tex2 : string
+            Texture names, stored as custom properties of the object
+        timer : s3o_codec.phase_timer
+            Collects the time spent in the "dedup" and "mesh build" phases
+        """
+        if timer is None:
+            timer = s3o_codec.phase_timer()
+        self.name = piece.name
+        self.xoffset = -1*piece.xoffset
+        self.yoffset = piece.zoffset
+        self.zoffset = piece.yoffset
+
+        # merge the vertices and validate the primitives
+        mesh = s3o_codec.prepare_mesh(piece, timer)
+        self.numVerts = mesh.numVerts
 
         # if it has no verts or faces create an EMPTY instead
         if(self.numVerts == 0):
-            existing_objects = bpy.data.objects[:]
-            bpy.ops.object.empty_add(type="PLAIN_AXES", location=(0, 0, 0))
-            self.ob = set(bpy.data.objects).difference(existing_objects).pop()            
-            self.ob.name = self.name
+            self.ob = new_empty(self.name, "PLAIN_AXES")
         else:
-            bm = bmesh.new()
-            for v in self.unique_verts:
-                bm.verts.new((v.xpos, v.ypos, v.zpos))
-                bm.verts.ensure_lookup_table()
-                bm.verts[-1].normal = Vector((v.xnormal, v.ynormal, v.znormal))
-            for f in self.faces:
-                try:
-                    bm.faces.new([bm.verts[self.vertids[i]] for i in f])
-                except ValueError:
-                    pass
-                except IndexError:
-                    pass
-                bm.faces.ensure_lookup_table()
-                uv_layer = bm.loops.layers.uv.verify()
-                # If size of faces != 0 then
-                if len(bm.faces) > 0:
-                    for i, loop in enumerate(bm.faces[-1].loops):
-                        uv = loop[uv_layer].uv
-                        uv[0] = self.verts[f[i]].texu
-                        uv[1] = self.verts[f[i]].texv
-
-            self.mesh = bpy.data.meshes.new(self.name)
-            bm.to_mesh(self.mesh)
-            self.ob = bpy.data.objects.new(self.name, self.mesh)
-            try:
-                #collection = bpy.data.collections.new(self.name)
-                collection = bpy.context.view_layer.active_layer_collection.collection
-                #bpy.context.scene.collection.children.link(collection)
-                collection.objects.link(self.ob)
-            except AttributeError:
-                # Blender < 2.80
-                bpy.context.scene.objects.link(self.ob)
-            try:
-                bpy.context.scene.update()
-            except AttributeError:
-                # Blender > 2.80
-                # The scene doesn't seem to need specifically updating in the latest 2.80
-                pass
-            try:
-                self.ob.select_set(True)
-            except AttributeError:
-                # Blender < 2.80
-                bpy.context.scene.objects.active = self.ob                
-
-            if hasattr(self.ob, "use_auto_smooth"):
-                self.ob.use_auto_smooth = False
-                # bpy.context.object.data.auto_smooth_angle = 0.785398 # 45 degrees, better than 30 for low poly stuff.
-
-            matidx = len(self.ob.data.materials)
-            self.ob.data.materials.append(material) 
-
-            for face in self.mesh.polygons:
-                face.material_index = matidx
-    
+            with timer.phase("mesh build"):
+                nverts = len(mesh.co)
+                npolys, width = mesh.polys.shape
+                timer.count("mesh build", verts=nverts, faces=npolys)
+
+                self.mesh = bpy.data.meshes.new(self.name)
+                self.mesh.vertices.add(nverts)
+                self.mesh.vertices.foreach_set("co", mesh.co.ravel())
+                self.mesh.loops.add(npolys * width)
+                self.mesh.loops.foreach_set("vertex_index", mesh.polys.ravel())
+                self.mesh.polygons.add(npolys)
+                self.mesh.polygons.foreach_set(
+                    "loop_start",
+                    np.arange(0, npolys * width, width, dtype=np.int32))
+                if bpy.app.version < (4, 0, 0):
+                    # Blender >= 4.0 deduces it from loop_start
+                    self.mesh.polygons.foreach_set(
+                        "loop_total", np.full(npolys, width, dtype=np.int32))
+                if mesh.numFaces > 0:
+                    uv_layer = self.mesh.uv_layers.new(name="UVMap")
+                    uv_layer.data.foreach_set("uv", mesh.uvs.ravel())
+                self.mesh.update(calc_edges=True)
+
+                self.ob = bpy.data.objects.new(self.name, self.mesh)
+                link_object(self.ob)
+
+                if hasattr(self.ob, "use_auto_smooth"):
+                    self.ob.use_auto_smooth = False
+                    # bpy.context.object.data.auto_smooth_angle = 0.785398 # 45 degrees, better than 30 for low poly stuff.
+
+                matidx = len(self.ob.data.materials)
+                self.ob.data.materials.append(material) 
+
+                self.mesh.polygons.foreach_set(
+                    "material_index", np.full(npolys, matidx, dtype=np.int32))
+
         if tex1 != "" and tex2 != "":
             self.ob["s3o_texture1"] = tex1
             self.ob["s3o_texture2"] = tex2
@@ -347,50 +303,9 @@ class s3o_piece(object):
             self.ob.parent = self.parent.ob
         self.ob.location = [self.xoffset, self.yoffset, self.zoffset]
         self.ob.rotation_mode = 'ZXY'
-
-        # load children
-        if(self.numChildren > 0):
-            # childrenOffset contains DWORDS containing offsets to child pieces
-            fhandle.seek(self.childrenOffset, os.SEEK_SET)
-            for i in range(0, self.numChildren):
-                tmp = fhandle.read(4)
-                offset = fhandle.tell()
-                data = struct.unpack("<I", tmp)
-                childOffset = data[0]
-                child = s3o_piece()
-                child.parent = self
-                child.load(fhandle, childOffset, material)
-                self.children.append(child)
-                fhandle.seek(offset, os.SEEK_SET)
         return
 
 
-class s3o_vert(object):
-    binary_format = "<8f"
-    xpos = 0.0
-    ypos = 0.0
-    zpos = 0.0
-    xnormal = 0.0
-    ynormal = 0.0
-    znormal = 0.0
-    texu = 0.0
-    texv = 0.0
-
-    def load(self, fhandle, offset):
-        fhandle.seek(offset, os.SEEK_SET)
-        tmp_data = fhandle.read(struct.calcsize(self.binary_format))
-        data = struct.unpack(self.binary_format, tmp_data)
-
-        self.xpos = -1*data[0]
-        self.ypos = data[2]
-        self.zpos = data[1]
-        self.xnormal = -1*data[3]
-        self.ynormal = data[5]
-        self.znormal = data[4]
-        self.texu = data[6]
-        self.texv = data[7]
-
-
 def new_material_legacy(tex1, tex2, texsdir, name="Material"):
     mat = bpy.data.materials.new(name=name + '.mat')
     mat.diffuse_color = (1.0, 1.0, 1.0)
@@ -402,8 +317,8 @@ def new_material_legacy(tex1, tex2, texsdir, name="Material"):
     mat.ambient = 1.0
     mat.alpha = 1.0
     mat.emit = 0.0
-    if tex1 and find_in_folder(texsdir, tex1):
-        fname = find_in_folder(texsdir, tex1)
+    fname = find_in_folder(texsdir, tex1) if tex1 else None
+    if fname:
         image = bpy.data.images.load(os.path.join(texsdir, fname))
         tex = bpy.data.textures.new(name + '.color', type='IMAGE')
         tex.image = image
@@ -414,8 +329,8 @@ def new_material_legacy(tex1, tex2, texsdir, name="Material"):
         mtex.use_map_color_diffuse = True 
         mtex.diffuse_color_factor = 1.0
         mtex.mapping = 'FLAT'
-    if tex2 and find_in_folder(texsdir, tex2):
-        fname = find_in_folder(texsdir, tex2)
+    fname = find_in_folder(texsdir, tex2) if tex2 else None
+    if fname:
         image = bpy.data.images.load(os.path.join(texsdir, fname))
         tex = bpy.data.textures.new(name + '.alpha', type='IMAGE')
         tex.image = image
@@ -453,9 +368,9 @@ def new_material(tex1, tex2, texsdir, name="Material"):
         mat.node_tree.links.new(mapping_node.inputs['Vector'],
                                 tex_coord_node.outputs['UV'])
     
-    if tex1 and find_in_folder(texsdir, tex1):
+    fname = find_in_folder(texsdir, tex1) if tex1 else None
+    if fname:
         #load diffuse texture, plug in UV mapping, link to base color.
-        fname = find_in_folder(texsdir, tex1)
         image = bpy.data.images.load(os.path.join(texsdir, fname))
         image.alpha_mode = 'CHANNEL_PACKED' #spring uses alpha as teamcolor
         tex_node = mat.node_tree.nodes.new('ShaderNodeTexImage')
@@ -472,10 +387,10 @@ def new_material(tex1, tex2, texsdir, name="Material"):
         mat.node_tree.links.new(principled.inputs['Base Color'], mix_node.outputs['Color'])
         mat.node_tree.links.new(tex_node.inputs['Vector'], mapping_node.outputs['Vector'])
         
-    if tex2 and find_in_folder(texsdir, tex2):
+    fname = find_in_folder(texsdir, tex2) if tex2 else None
+    if fname:
         # load reflectivity / emission / data texture, plug in same UV map, 
         # set to non colour data and link to appropriate data.
-        fname = find_in_folder(texsdir, tex2)
         image = bpy.data.images.load(os.path.join(texsdir, fname))
         # The alpha for this file is one bit, but is actual true alpha and 
         # applies to both textures once ingame
@@ -505,42 +420,74 @@ def new_material(tex1, tex2, texsdir, name="Material"):
     return mat
 
 
-def load_s3o_file(s3o_filename, BATCH_LOAD=False):
-    basename = os.path.splitext(os.path.basename(s3o_filename))[0]
-    objdir = os.path.dirname(s3o_filename)
-    rootdir = folder_root(objdir, "objects3d")
-    if rootdir is None:
-        texsdir = objdir
-    else:
-        texsdir = os.path.join(rootdir, find_in_folder(rootdir, 'unittextures'))
+def load_s3o_file(s3o_filename, BATCH_LOAD=False, timer=None, model=None):
+    """Import a s3o file into the current scene
+
+    Parameters
+    ==========
 
-    fhandle = open(s3o_filename, "rb")
+    s3o_filename : str
+        The s3o file. The textures are looked for next to it
+    model : s3o_codec.s3o_model
+        The model, already loaded from s3o_filename (e.g. by
+        s3o_codec.preparse() in another process). None to load it here
 
-    header = s3o_header()
-    header.load(fhandle)
+    Returns
+    =======
 
-    mat = new_material(header.texture1, header.texture2, texsdir, name=basename)
+    timer : s3o_codec.phase_timer
+        Time spent in each phase of the import. If a timer is provided, the
+        phases are accumulated to it
+    """
+    if timer is None:
+        timer = s3o_codec.phase_timer()
+    basename = os.path.splitext(os.path.basename(s3o_filename))[0]
+    objdir = os.path.dirname(s3o_filename)
 
-    rootPiece = s3o_piece()
-    rootPiece.load(fhandle, header.rootPieceOffset, mat, header.texture1, header.texture2)
+    loaded = model is None
+    if loaded:
+        with timer.phase("parse"):
+            model = s3o_codec.load(s3o_filename)
+        timer.count("parse", bytes=model.size, pieces=len(list(model.pieces())))
+    try:
+        header = model.header
+        # Blender axes
+        midx, midy, midz = -header.midx, header.midy, header.midz
+
+        with timer.phase("materials"):
+            texsdir = textures_folder(objdir)
+            mat = new_material(header.texture1, header.texture2, texsdir, name=basename)
+
+        # load the pieces, parents first
+        rootPiece = s3o_piece()
+        rootPiece.children = []
+        rootPiece.load(model.root, mat, header.texture1, header.texture2, timer)
+        pending = [(rootPiece, model.root)]
+        while pending:
+            parent, parentPiece = pending.pop()
+            for childPiece in parentPiece.children:
+                child = s3o_piece()
+                child.parent = parent
+                child.children = []
+                child.load(childPiece, mat, timer=timer)
+                parent.children.append(child)
+                pending.append((child, childPiece))
 
-    # create collision sphere
-    existing_objects = bpy.data.objects[:]
-    bpy.ops.object.empty_add(type="SPHERE",
-                             location=(header.midx, header.midz, header.midy),
-                             radius=header.radius)
-    new_object = set(bpy.data.objects).difference(existing_objects).pop()
-    new_object.name = basename + '.SpringRadius'
+        # create collision sphere
+        new_empty(basename + '.SpringRadius', "SPHERE",
+                  display_size=header.radius,
+                  location=(midx, midz, midy))
 
-    existing_objects = bpy.data.objects[:]
-    bpy.ops.object.empty_add(type="ARROWS",
-                             location=(header.midx, header.midz, header.midy),
-                             radius=10.0)
-    new_object = set(bpy.data.objects).difference(existing_objects).pop()
-    new_object.name = basename + '.SpringRadius'
+        # and the height marker, which the exporter reads from its Z location
+        new_empty(basename + '.SpringHeight', "ARROWS",
+                  display_size=10.0,
+                  location=(midx, midz, header.height))
+    finally:
+        if loaded:
+            # Release the file, even if the import failed
+            model.close()
 
-    fhandle.close()
-    return
+    return timer
 
 
 class ImportS3O(bpy.types.Operator, ImportHelper):
@@ -566,9 +513,11 @@ class ImportS3O(bpy.types.Operator, ImportHelper):
             bpy.ops.object.mode_set(mode="OBJECT")
         bpy.ops.object.select_all(action="DESELECT")
         
-        load_s3o_file(self.filepath)
+        timer = load_s3o_file(self.filepath)
         
         bpy.ops.object.select_all(action="DESELECT")
+        self.report({"INFO"}, "Imported in %.3f s: %s" % (timer.total(), timer.summary()))
+        timer.dump(file=self.filepath, operation="import")
         return {"FINISHED"}
 
 
@@ -7,4 +7,4 @@ fi
 
 SCRIPT_DIR=$( cd -- "$( dirname -- "${BASH_SOURCE[0]}" )" &> /dev/null && pwd )
 
-find "${1}" -maxdepth 1 -iname '*.s3o' -print0 | xargs -0 -I {} -P $(nproc) blender -b -P ${SCRIPT_DIR}/scripts/s3o_optimize.py -- "{}"
+python3 ${SCRIPT_DIR}/scripts/s3o_pool.py optimize "${1}" -j $(nproc)
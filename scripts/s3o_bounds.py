@@ -0,0 +1,62 @@
+# Estimate the collision sphere (radius and center) and height of *.s3o models
+# from their vertices, and optionally write them into the headers.
+#
+# This script doesn't need Blender, just Python and NumPy:
+#   python3 scripts/s3o_bounds.py <folder_with_.s3o> [--update]
+#
+# One JSON line is written per model, with the header values and the
+# estimated ones. With --update, the headers are rewritten in place, the rest
+# of each file is kept byte by byte.
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import s3o_codec
+
+def file_iter(path, par_ext):
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            ext = os.path.splitext(filename)[1]
+            if ext.lower() == par_ext:
+                yield os.path.join(dirpath, filename)
+
+def bounds(par_filename : str, update=False):
+    try:
+        with open(par_filename, "rb") as fhandle:
+            model = s3o_codec.loads(fhandle.read())
+    except (IOError, ValueError) as e:
+        return {"file": par_filename, "error": str(e)}
+
+    header = model.header
+    result = {
+        "file": par_filename,
+        "radius": header.radius,
+        "height": header.height,
+        "mid": [header.midx, header.midy, header.midz],
+    }
+    center, radius, height = s3o_codec.estimate_bounds(model)
+    if center is None:
+        return result
+    result["estimated_radius"] = radius
+    result["estimated_height"] = height
+    result["estimated_mid"] = center.tolist()
+
+    if update:
+        header.radius = radius
+        header.height = height
+        header.midx, header.midy, header.midz = center
+        s3o_codec.dump(model, par_filename)
+        result["updated"] = True
+    return result
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--update"]
+    if len(args) != 1:
+        print("Usage: python3 s3o_bounds.py <folder_with_.s3o> [--update]")
+        sys.exit(1)
+    update = "--update" in sys.argv[1:]
+    paths = [args[0]] if os.path.isfile(args[0]) else file_iter(args[0], ".s3o")
+    for filepath_src in paths:
+        print(json.dumps(bounds(filepath_src, update)))
@@ -0,0 +1,66 @@
+# Catalogue *.s3o models: texture names, piece hierarchy, vertex and index counts.
+#
+# This script doesn't need Blender, just Python and NumPy:
+#   python3 scripts/s3o_catalogue.py <folder_with_.s3o> [output.jsonl]
+#
+# One JSON line is written per model. Only the headers and the piece hierarchy
+# are read, the geometry is never decoded.
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import s3o_codec
+
+def file_iter(path, par_ext):
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            ext = os.path.splitext(filename)[1]
+            if ext.lower() == par_ext:
+                yield os.path.join(dirpath, filename)
+
+def describe(par_filename : str):
+    try:
+        model = s3o_codec.scan(par_filename)
+    except (IOError, ValueError) as e:
+        return {"file": par_filename, "error": str(e)}
+
+    header = model.header
+    pieces = []
+    for piece in model.pieces():
+        pieces.append({
+            "name": piece.name,
+            "parent": piece.parent.name if piece.parent is not None else None,
+            "offset": [piece.xoffset, piece.yoffset, piece.zoffset],
+            "primitiveType": piece.primitiveType,
+            "numVerts": piece.numVerts,
+            "vertTableSize": piece.vertTableSize,
+        })
+    return {
+        "file": par_filename,
+        "size": model.size,
+        "texture1": header.texture1,
+        "texture2": header.texture2,
+        "radius": header.radius,
+        "height": header.height,
+        "mid": [header.midx, header.midy, header.midz],
+        "numPieces": len(pieces),
+        "numVerts": sum(p["numVerts"] for p in pieces),
+        "vertTableSize": sum(p["vertTableSize"] for p in pieces),
+        "pieces": pieces,
+    }
+
+def catalogue(par_import_path : str, out):
+    for filepath_src in file_iter(par_import_path, ".s3o"):
+        out.write(json.dumps(describe(filepath_src)) + "\n")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python3 s3o_catalogue.py <folder_with_.s3o> [output.jsonl]")
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as out:
+            catalogue(sys.argv[1], out)
+    else:
+        catalogue(sys.argv[1], sys.stdout)
@@ -0,0 +1,89 @@
+# Incremental build manifest for the conversion scripts.
+#
+# A small SQLite database (.s3o_manifest.sqlite) in the output folder records,
+# for every produced file, the hash of its source, the version of the add-ons
+# that produced it (from their bl_info) and the options used. A source is
+# converted again only if any of those changed, or the output is missing or
+# was modified since. SQLite takes care of the locking, so several processes
+# may share a manifest.
+#
+# This module doesn't need Blender.
+
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+
+MANIFEST_NAME = ".s3o_manifest.sqlite"
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def file_hash(filename):
+    """SHA-256 of the file contents, None if it doesn't exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(filename, "rb") as fhandle:
+            for chunk in iter(lambda: fhandle.read(1 << 20), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+def addon_version(*filenames):
+    """Version of the add-ons, read from their bl_info without importing them.
+    The file names are relative to the repository root, unless absolute"""
+    versions = []
+    for filename in filenames:
+        filename = os.path.join(ROOT_DIR, filename)
+        with open(filename, "rb") as fhandle:
+            tree = ast.parse(fhandle.read(), filename)
+        version = "?"
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and \
+                    any(getattr(t, "id", None) == "bl_info" for t in node.targets):
+                info = ast.literal_eval(node.value)
+                version = ".".join(str(v) for v in info.get("version", ()))
+        versions.append("%s %s" % (os.path.splitext(os.path.basename(filename))[0], version))
+    return ", ".join(versions)
+
+class manifest(object):
+    """Manifest of the files produced in a folder. It may be used from
+    several threads, one at a time"""
+    def __init__(self, folder):
+        self.folder = os.path.abspath(folder)
+        os.makedirs(self.folder, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.folder, MANIFEST_NAME), timeout=60,
+                                  check_same_thread=False)
+        with self.db:
+            self.db.execute("CREATE TABLE IF NOT EXISTS outputs ("
+                            "output TEXT PRIMARY KEY, source TEXT, "
+                            "source_hash TEXT, version TEXT, options TEXT, "
+                            "output_hash TEXT)")
+
+    def key(self, filepath_dst):
+        return os.path.relpath(os.path.abspath(filepath_dst), self.folder)
+
+    @staticmethod
+    def encode_options(options):
+        return json.dumps(options or {}, sort_keys=True)
+
+    def is_current(self, filepath_dst, source_hash, version, options=None):
+        """Whether filepath_dst was produced from a source with this hash,
+        by this version and with these options, and wasn't modified since"""
+        row = self.db.execute("SELECT source_hash, version, options, output_hash "
+                              "FROM outputs WHERE output = ?",
+                              (self.key(filepath_dst),)).fetchone()
+        return row is not None and \
+            row[:3] == (source_hash, version, self.encode_options(options)) and \
+            row[3] is not None and row[3] == file_hash(filepath_dst)
+
+    def record(self, filepath_dst, filepath_src, source_hash, version, options=None):
+        """Record filepath_dst as produced from filepath_src"""
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?, ?, ?)",
+                            (self.key(filepath_dst), os.path.abspath(filepath_src),
+                             source_hash, version, self.encode_options(options),
+                             file_hash(filepath_dst)))
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,128 @@
+# Mass optimize *.s3o without Blender, working on the binaries directly.
+#
+# This script doesn't need Blender, just Python and NumPy:
+#   python3 scripts/s3o_optimize_headless.py <folder_with_.s3o> [options]
+#
+# It does what s3o_optimize.py does through Blender (triangulate, merge the
+# duplicate vertices, remove the base plate), plus dropping the degenerate
+# triangles and unused vertices, and reordering the triangles and vertices for
+# the GPU vertex cache. The piece tree, names, offsets, header and texture
+# names are kept. Pieces without faces (e.g. emit points) are left untouched.
+#
+# The models are overwritten, unless --output is given. One JSON line is
+# written per model, with the vertex and index counts before and after. The
+# optimized models are recorded in a manifest (see s3o_manifest.py), so the
+# ones already optimized with the same options are skipped on later runs.
+#
+# Options:
+#   --output DIR          write the optimized models to DIR instead
+#   --keep-base-plate     don't remove the base plate
+#   --no-vertex-cache     don't reorder for the vertex cache
+#   -j N                  number of processes, the number of CPUs by default
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import s3o_codec
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import s3o_manifest
+
+def file_iter(path, par_ext):
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            ext = os.path.splitext(filename)[1]
+            if ext.lower() == par_ext:
+                yield os.path.join(dirpath, filename)
+
+def optimize_piece(piece, remove_base_plate=True, vertex_cache=True):
+    """Optimize the geometry of a piece in place, as triangles"""
+    faces = piece.faces()
+    if not len(faces):
+        return
+    if faces.shape[1] == 4:
+        faces = faces[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 3)
+    verts = np.array(piece.verts, dtype=s3o_codec.VERT_DTYPE)
+    tris = s3o_codec.remove_degenerate(verts, faces)
+    verts, tris = s3o_codec.weld_vertices(verts, tris)
+    # Welding may collapse some more triangles
+    tris = s3o_codec.remove_degenerate(verts, tris)
+    if remove_base_plate:
+        plate = s3o_codec.find_base_plate(verts, tris)
+        tris = np.delete(tris, plate, axis=0)
+    if not len(tris):
+        # Only degenerate faces, which might be there on purpose
+        return
+    verts, tris = s3o_codec.drop_unreferenced(verts, tris)
+    if vertex_cache:
+        tris = s3o_codec.optimize_vertex_cache(tris, len(verts))
+        verts, tris = s3o_codec.reorder_vertices(verts, tris)
+    piece.verts = verts
+    piece.indices = np.ascontiguousarray(tris, dtype=s3o_codec.INDEX_DTYPE).ravel()
+    piece.primitiveType = 0
+
+def optimize(par_filename : str, filepath_dst=None, remove_base_plate=True,
+             vertex_cache=True):
+    result = {"file": par_filename}
+    try:
+        with open(par_filename, "rb") as fhandle:
+            model = s3o_codec.loads(fhandle.read())
+        pieces = list(model.pieces())
+        result["verts"] = sum(len(p.verts) for p in pieces)
+        result["indices"] = sum(len(p.indices) for p in pieces)
+        for piece in pieces:
+            optimize_piece(piece, remove_base_plate, vertex_cache)
+        result["optimized_verts"] = sum(len(p.verts) for p in pieces)
+        result["optimized_indices"] = sum(len(p.indices) for p in pieces)
+        s3o_codec.dump(model, filepath_dst or par_filename)
+    except (IOError, ValueError, TypeError) as e:
+        result["error"] = str(e)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimize s3o models without Blender")
+    parser.add_argument("path", help="s3o file or folder")
+    parser.add_argument("--output", help="folder for the optimized models")
+    parser.add_argument("--keep-base-plate", action="store_true")
+    parser.add_argument("--no-vertex-cache", action="store_true")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if os.path.isfile(args.path):
+        root, paths = os.path.dirname(args.path) or os.curdir, [args.path]
+    else:
+        root, paths = args.path, sorted(file_iter(args.path, ".s3o"))
+    dests = list(paths)
+    if args.output:
+        dests = [os.path.join(args.output, os.path.relpath(p, root)) for p in paths]
+        for dest in dests:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    manifest = s3o_manifest.manifest(args.output or root)
+    version = s3o_manifest.addon_version("s3o_codec.py")
+    options = {"remove_base_plate": not args.keep_base_plate,
+               "vertex_cache": not args.no_vertex_cache}
+    pending = [(p, d) for p, d in zip(paths, dests)
+               if not manifest.is_current(d, s3o_manifest.file_hash(p), version, options)]
+    paths, dests = [p for p, _ in pending], [d for _, d in pending]
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        results = executor.map(optimize, paths, dests,
+                               [not args.keep_base_plate] * len(paths),
+                               [not args.no_vertex_cache] * len(paths),
+                               chunksize=8)
+        for filepath_src, filepath_dst, result in zip(paths, dests, results):
+            failed += "error" in result
+            if "error" not in result:
+                # In place, the hash of the optimized model is recorded
+                manifest.record(filepath_dst, filepath_src,
+                                s3o_manifest.file_hash(filepath_src), version, options)
+            print(json.dumps(result))
+    manifest.close()
+    sys.exit(1 if failed else 0)
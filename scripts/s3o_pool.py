@@ -0,0 +1,179 @@
+# Spread s3o_optimize.py / s3o_from_blend.py jobs across a pool of persistent
+# Blender workers (see s3o_worker.py), instead of starting Blender per file.
+#
+#   python3 scripts/s3o_pool.py optimize <folder_with_.s3o> [-j N]
+#   python3 scripts/s3o_pool.py from_blend <folder_with_.blend> <output_s3o_folder> [-j N]
+#
+# N defaults to the number of CPUs. The Blender executable is taken from the
+# BLENDER environment variable, "blender" by default. Pass -v to see the
+# Blender output of the jobs.
+#
+# The produced files are recorded in a manifest (see s3o_manifest.py), in the
+# output folder, so the files are only processed again if they, the add-ons
+# version or the options changed.
+
+import argparse
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MARKER = "S3O_WORKER"
+
+sys.path.insert(0, SCRIPT_DIR)
+import s3o_manifest
+
+# What each mode runs, for the manifest. Keep in sync with s3o_optimize.py and
+# s3o_from_blend.py
+ADDONS = {
+    "optimize": ("s3o_import.py", "s3o_export_2022.py", "s3o_codec.py"),
+    "from_blend": ("s3o_export_2022.py", "s3o_codec.py"),
+}
+OPTIONS = {
+    "optimize": {"use_mesh_modifiers": True, "use_remove_base_plate": True,
+                 "use_triangles": True, "remove_suffix": False},
+    "from_blend": {"use_triangles": True},
+}
+
+def list_files(path, par_ext):
+    # Just the folder itself, as the shell scripts did (find -maxdepth 1)
+    for filename in sorted(os.listdir(path)):
+        if os.path.splitext(filename)[1].lower() == par_ext:
+            yield os.path.join(path, filename)
+
+def optimize_jobs(par_import_path, manifest, version):
+    """The models are optimized in place, so the manifest records the hash of
+    the optimized ones"""
+    jobs = {}
+    for filepath_src in list_files(par_import_path, ".s3o"):
+        if not manifest.is_current(filepath_src, s3o_manifest.file_hash(filepath_src),
+                                   version, OPTIONS["optimize"]):
+            jobs[filepath_src] = (filepath_src, filepath_src)
+    return jobs
+
+def from_blend_jobs(par_import_path, par_export_path, manifest, version):
+    jobs = {}
+    for filepath_src in list_files(par_import_path, ".blend"):
+        name = os.path.splitext(os.path.basename(filepath_src))[0]
+        filepath_dst = os.path.join(par_export_path, name + ".s3o")
+        if not manifest.is_current(filepath_dst, s3o_manifest.file_hash(filepath_src),
+                                   version, OPTIONS["from_blend"]):
+            jobs[filepath_src + "\t" + filepath_dst] = (filepath_src, filepath_dst)
+    return jobs
+
+class worker(object):
+    """A Blender process running s3o_worker.py"""
+    def __init__(self, mode, verbose=False):
+        self.mode = mode
+        self.verbose = verbose
+        self.process = None
+
+    def start(self):
+        blender = os.environ.get("BLENDER", "blender")
+        self.process = subprocess.Popen(
+            [blender, "-b", "-P", os.path.join(SCRIPT_DIR, "s3o_worker.py"),
+             "--", self.mode],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=None if self.verbose else subprocess.DEVNULL,
+            universal_newlines=True, bufsize=1)
+
+    def run(self, job):
+        """Run a job, returning (ok, message)"""
+        if self.process is None or self.process.poll() is not None:
+            self.start()
+        try:
+            self.process.stdin.write(job + "\n")
+            self.process.stdin.flush()
+        except (IOError, OSError) as e:
+            self.process = None
+            return False, "worker died: " + str(e)
+        for line in self.process.stdout:
+            if not line.startswith(MARKER + "\t"):
+                if self.verbose:
+                    sys.stdout.write(line)
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if fields[1] == "ok":
+                return True, ""
+            return False, fields[-1]
+        # The worker crashed, a new one is started for the next job
+        self.process.wait()
+        self.process = None
+        return False, "worker died"
+
+    def stop(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+
+def run_pool(mode, jobs, num_workers, verbose=False, on_done=None):
+    """Run the jobs on num_workers workers, returning the failed ones.
+    on_done(job) is called, one job at a time, after each successful one"""
+    pending = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+    failed = []
+    lock = threading.Lock()
+
+    def serve():
+        w = worker(mode, verbose)
+        try:
+            while True:
+                try:
+                    job = pending.get_nowait()
+                except queue.Empty:
+                    return
+                ok, message = w.run(job)
+                name = job.replace("\t", " -> ")
+                with lock:
+                    if ok:
+                        print("Done: " + name)
+                        if on_done is not None:
+                            on_done(job)
+                    else:
+                        print("FAILED: %s (%s)" % (name, message))
+                        failed.append(job)
+                    sys.stdout.flush()
+        finally:
+            w.stop()
+
+    threads = [threading.Thread(target=serve)
+               for _ in range(max(1, min(num_workers, len(jobs))))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run s3o jobs on a pool of Blender workers")
+    parser.add_argument("mode", choices=("optimize", "from_blend"))
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of Blender workers")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="show the Blender output")
+    args = parser.parse_args()
+
+    if (args.mode, len(args.paths)) not in (("optimize", 1), ("from_blend", 2)):
+        parser.print_usage()
+        sys.exit(1)
+    manifest = s3o_manifest.manifest(args.paths[-1])
+    version = s3o_manifest.addon_version(*ADDONS[args.mode])
+    if args.mode == "optimize":
+        jobs = optimize_jobs(args.paths[0], manifest, version)
+    else:
+        jobs = from_blend_jobs(args.paths[0], args.paths[1], manifest, version)
+
+    def on_done(job):
+        filepath_src, filepath_dst = jobs[job]
+        source_hash = s3o_manifest.file_hash(filepath_src)
+        manifest.record(filepath_dst, filepath_src, source_hash, version,
+                        OPTIONS[args.mode])
+
+    failed = run_pool(args.mode, list(jobs), args.jobs, args.verbose, on_done)
+    manifest.close()
+    print("%d jobs, %d failed" % (len(jobs), len(failed)))
+    sys.exit(1 if failed else 0)
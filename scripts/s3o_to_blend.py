@@ -1,10 +1,23 @@
 # Mass convert *.s3o to *.blend, this needs the s3o_import.py addon installed.
 #
-# This script won't override models with the same name.
+#   blender -b -P scripts/s3o_to_blend.py -- <folder_with_.s3o> <output_blend_folder> [processes]
+#
+# The conversions are recorded in a manifest in the output folder (see
+# s3o_manifest.py), so a model is only converted again if the .s3o file or the
+# importer version changed, or the .blend file is missing or was modified.
+#
+# The models are parsed and their vertices merged (s3o_codec.preparse()) by a
+# pool of processes, one per CPU by default, while Blender builds and saves the
+# previous ones. bpy is only imported by the main process: the pool processes
+# import this script too, so its top level must not need Blender.
 
-import bpy
+import multiprocessing
 import os
-import s3o_import
+import sys
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import s3o_manifest
 
 def file_iter(path, par_ext):
     for dirpath, _, filenames in os.walk(path):
@@ -13,31 +26,73 @@ def file_iter(path, par_ext):
             if ext.lower() == par_ext:
                 yield os.path.join(dirpath, filename)
 
+def preparse(filepath_src):
+    """Run by the pool processes"""
+    import s3o_codec
+    timer = s3o_codec.phase_timer()
+    return s3o_codec.preparse(filepath_src, timer), timer
+
 def reset_blend():
+    import bpy
     bpy.ops.wm.read_factory_settings(use_empty=True)
 
-def convert_recursive(par_import_path : str, par_export_path : str):
+def convert_recursive(par_import_path : str, par_export_path : str, processes=None):
+    import bpy
+    import s3o_import
+
+    manifest = s3o_manifest.manifest(par_export_path)
+    version = s3o_manifest.addon_version(s3o_import.__file__, s3o_import.s3o_codec.__file__)
+    jobs = []
     for filepath_src in file_iter(par_import_path, ".s3o"):
         filepath_dst = os.path.join(par_export_path, os.path.splitext(os.path.basename(filepath_src))[0] + ".blend")
 
-        if os.path.exists(filepath_dst):
-            print("Existing %r -> %r" % (filepath_src, filepath_dst))
+        source_hash = s3o_manifest.file_hash(filepath_src)
+        if manifest.is_current(filepath_dst, source_hash, version):
+            print("Up to date %r -> %r" % (filepath_src, filepath_dst))
             continue
+        jobs.append((filepath_src, filepath_dst, source_hash))
+
+    # The pool processes find the add-on modules where Blender does
+    ctx = multiprocessing.get_context("spawn")
+    processes = processes or os.cpu_count() or 1
+    with ctx.Pool(processes) as pool:
+        # Keep a few models ahead of Blender, but not the whole folder in memory
+        queued = iter(jobs)
+        results = deque()
+        def submit():
+            job = next(queued, None)
+            if job is not None:
+                results.append((job, pool.apply_async(preparse, (job[0],))))
+        for _ in range(2 * processes):
+            submit()
+
+        while results:
+            (filepath_src, filepath_dst, source_hash), result = results.popleft()
+            submit()
+            try:
+                model, timer = result.get()
+            except (IOError, ValueError, TypeError) as e:
+                print("Failed %r: %s" % (filepath_src, e))
+                continue
 
-        print("Converting %r -> %r" % (filepath_src, filepath_dst))
+            print("Converting %r -> %r" % (filepath_src, filepath_dst))
 
-        context = bpy.context;
-        if context.mode != "OBJECT":
-            if not context.scene.objects.active:
-                context.scene.objects.active = context.scene.objects[0]
-            bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.select_all(action="DESELECT")
+            context = bpy.context;
+            if context.mode != "OBJECT":
+                if not context.scene.objects.active:
+                    context.scene.objects.active = context.scene.objects[0]
+                bpy.ops.object.mode_set(mode="OBJECT")
+            bpy.ops.object.select_all(action="DESELECT")
 
-        s3o_import.load_s3o_file(filepath_src)
-        bpy.ops.wm.save_as_mainfile(filepath=filepath_dst)
+            s3o_import.load_s3o_file(filepath_src, timer=timer, model=model)
+            bpy.ops.wm.save_as_mainfile(filepath=filepath_dst)
+            manifest.record(filepath_dst, filepath_src, source_hash, version)
+            print(timer.summary())
+            timer.dump(file=filepath_src, operation="import")
 
-        reset_blend()
+            reset_blend()
+    manifest.close()
 
 if __name__ == "__main__":
-    import sys
-    convert_recursive(sys.argv[5], sys.argv[6])
\ No newline at end of file
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[5:]
+    convert_recursive(argv[0], argv[1], int(argv[2]) if len(argv) > 2 else None)
@@ -0,0 +1,67 @@
+# Long-lived Blender worker, running s3o_optimize.py or s3o_from_blend.py jobs
+# read from stdin, so Blender starts (and registers its add-ons) just once.
+#
+#   blender -b -P scripts/s3o_worker.py -- optimize
+#   blender -b -P scripts/s3o_worker.py -- from_blend
+#
+# Each stdin line is a job: the .s3o file to optimize, or the .blend file and
+# the destination .s3o separated by a tab. When a job is done, a line
+#   S3O_WORKER<tab>ok<tab><job>
+# or
+#   S3O_WORKER<tab>error<tab><job><tab><message>
+# is written to stdout. The worker quits when stdin is closed. It is meant to
+# be driven by s3o_pool.py, which spreads the jobs across several workers.
+
+import os
+import sys
+import traceback
+
+import bpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MARKER = "S3O_WORKER"
+
+def ensure_exporter():
+    # Resetting to the factory settings may unregister the add-on
+    if not hasattr(bpy.types, "EXPORT_SCENE_OT_s3o"):
+        import s3o_export_2022
+        s3o_export_2022.register()
+
+def run_optimize(job):
+    import s3o_optimize
+    s3o_optimize.convert(job)   # starts by resetting to factory settings
+
+def run_from_blend(job):
+    import s3o_from_blend
+    filepath_src, filepath_dst = job.split("\t")
+    bpy.ops.wm.open_mainfile(filepath=filepath_src)
+    ensure_exporter()
+    s3o_from_blend.convert(filepath_dst)
+
+def reply(*fields):
+    sys.stdout.write("\t".join((MARKER,) + fields) + "\n")
+    sys.stdout.flush()
+
+def serve(mode):
+    run = {"optimize": run_optimize, "from_blend": run_from_blend}[mode]
+    for line in sys.stdin:
+        job = line.rstrip("\n")
+        if not job:
+            continue
+        try:
+            run(job)
+        except Exception as e:
+            traceback.print_exc()
+            reply("error", job, str(e).replace("\n", " "))
+        else:
+            reply("ok", job)
+        # Don't carry anything over to the next job
+        bpy.ops.wm.read_factory_settings(use_empty=True)
+
+if __name__ == "__main__":
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    if len(argv) != 1 or argv[0] not in ("optimize", "from_blend"):
+        print("Usage: blender -b -P s3o_worker.py -- optimize|from_blend")
+        sys.exit(1)
+    serve(argv[0])